@@ -1,12 +1,17 @@
+import io
+import multiprocessing
 import os
 import re
+import select
 import sys
 import threading
 import time
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Deque, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 # Fix Windows console encoding for Unicode player names
 if sys.platform == "win32":
@@ -15,13 +20,16 @@ if sys.platform == "win32":
             _s.reconfigure(encoding="utf-8", errors="replace")
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 from groq import Groq
 from awpy.demo import DemoParser
 from awpy import Demo as AwpyDemo
+import numpy as np
 import pandas as pd
-from sqlalchemy.pool import QueuePool
+
+from rate_limit import TokenBucket
 
 # Import stats_card from the same directory as this script
 import importlib.util as _ilu
@@ -46,13 +54,119 @@ load_dotenv()
 
 MODEL_NAME = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")
 PARSE_POLL_INTERVAL = int(os.getenv("PARSE_POLL_INTERVAL", "3"))
+# Idle wait between re-checks while LISTENing; notifications wake it early.
+PARSE_LISTEN_TIMEOUT = int(os.getenv("PARSE_LISTEN_TIMEOUT", "30"))
+# Channel notified by the trigger in migration 008_notify_matches_ready.sql.
+MATCHES_READY_CHANNEL = "matches_ready"
+LISTEN_RETRY_MAX_SECONDS = 300
 PARSE_BATCH_SIZE = int(os.getenv("PARSE_BATCH_SIZE", "15"))
 PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "5"))
 PARSE_RATE_LIMIT = int(os.getenv("PARSE_RATE_LIMIT", "15"))
-PARSE_DB_POOL = int(os.getenv("PARSE_DB_POOL", "10"))
+# Bounds for the adaptive number of concurrent AI requests.
+PARSE_AI_MIN_CONCURRENCY = int(os.getenv("PARSE_AI_MIN_CONCURRENCY", "1"))
+PARSE_AI_MAX_CONCURRENCY = int(os.getenv("PARSE_AI_MAX_CONCURRENCY", str(PARSE_WORKERS)))
+# Times a rate-limited AI request is retried (after backing off) before the
+# match is handed back as QUOTA_EXCEEDED.
+PARSE_AI_QUOTA_RETRIES = int(os.getenv("PARSE_AI_QUOTA_RETRIES", "2"))
+QUOTA_BACKOFF_SECONDS = 45
+# One connection per worker thread plus the main loop's.
+PARSE_DB_POOL = int(os.getenv("PARSE_DB_POOL", str(PARSE_WORKERS + 1)))
 PARSE_DB_OVERFLOW = int(os.getenv("PARSE_DB_OVERFLOW", "20"))
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", str(os.cpu_count() or 1)))
+# Seconds before a parse claim on a match (see fetch_matches) is considered
+# abandoned and the match can be claimed again.
+PARSE_CLAIM_TTL = int(os.getenv("PARSE_CLAIM_TTL", "900"))
+# Demos smaller than this are empty or truncated downloads and are failed
+# without being parsed.
+MIN_DEMO_BYTES = int(os.getenv("MIN_DEMO_BYTES", "1024"))
+
+_MATCH_ID_RE = re.compile(r"(\d+)")
+_MAP_NAME_RE = re.compile(r"(de_[a-z0-9_]+)")
+_RETRY_RE = re.compile(r"(?:retryDelay|retry in|try again in)[^0-9]*(\d+(?:\.\d+)?)s")
+# Everything str.isalnum() rejects (\w is alnum plus "_").
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+# Text-format COPY escapes; NULL is spelled \N.
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# Buy-menu item name -> economy category ("primary", "pistol" or "utility").
+_WEAPON_CATEGORY: Dict[str, str] = {
+    **dict.fromkeys(
+        (
+            # rifles
+            "ak47",
+            "m4a1",
+            "m4a1_silencer",
+            "m4a4",
+            "aug",
+            "sg556",
+            "galilar",
+            "famas",
+            "awp",
+            "ssg08",
+            "g3sg1",
+            "scar20",
+            # SMGs
+            "mac10",
+            "mp9",
+            "mp7",
+            "mp5sd",
+            "ump45",
+            "p90",
+            "bizon",
+            # heavies
+            "nova",
+            "xm1014",
+            "mag7",
+            "m249",
+            "negev",
+            "sawedoff",
+        ),
+        "primary",
+    ),
+    **dict.fromkeys(
+        (
+            "glock",
+            "hkp2000",
+            "usp_silencer",
+            "p250",
+            "fiveseven",
+            "tec9",
+            "cz75a",
+            "deagle",
+            "revolver",
+            "elite",
+        ),
+        "pistol",
+    ),
+    **dict.fromkeys(
+        (
+            "hegrenade",
+            "flashbang",
+            "smokegrenade",
+            "molotov",
+            "incgrenade",
+            "decoy",
+        ),
+        "utility",
+    ),
+}
+_UTILITY_WEAPONS = frozenset(
+    name for name, category in _WEAPON_CATEGORY.items() if category == "utility"
+)
+
+# Side labels as they appear in demo output, upper-cased, and demoparser2's
+# numeric team values.
+_SIDE_BY_NAME: Dict[str, str] = {
+    "CT": "CT",
+    "COUNTER-TERRORIST": "CT",
+    "COUNTERTERRORIST": "CT",
+    "T": "T",
+    "TERRORIST": "T",
+}
+_SIDE_BY_TEAM_NUM: Dict[int, str] = {3: "CT", 2: "T"}
 
 _rate_limiter = None
+_ai_limiter = None
 
 
 def log(msg: str) -> None:
@@ -69,92 +183,168 @@ def get_db_url() -> str:
     )
 
 
+@contextmanager
+def checkout(pool: ThreadedConnectionPool) -> Iterator[Any]:
+    """Borrow a connection from ``pool`` and always hand it back."""
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
 def fetch_matches(
     cursor: RealDictCursor, match_id: Optional[int], limit: int = 10
 ) -> List[Dict[str, Any]]:
+    """Claim and return matches that still need a coach tip.
+
+    Rows are locked with ``for update skip locked`` and stamped with
+    ``parse_claimed_at`` in the same statement, so concurrent parsers never
+    pick up the same demo. A claim older than PARSE_CLAIM_TTL seconds (left
+    behind by a crashed parser) no longer blocks the row. The claim is only
+    visible to other parsers once the caller's transaction commits.
+    """
     if match_id is not None:
-        cursor.execute(
-            """
-                        select m.id,
-                               m.user_id,
-                               m.file_path,
-                               u.username,
-                               u.language,
-                               u.coach_style
-                        from public.matches_to_download m
-                        left join public.users u
-                            on u.steam_id = m.user_id
-                        where m.id = %s
-                          and m.coach_tip is null
-                          and m.status not in ('notified', 'error')
-            """,
-            (match_id,),
+        candidates = """
+                        select id
+                        from public.matches_to_download
+                        where id = %s
+                          and coach_tip is null
+                          and status not in ('notified', 'error')
+                          and (parse_claimed_at is null
+                               or parse_claimed_at < now() - %s * interval '1 second')
+                        for update skip locked
+        """
+        params: Tuple[Any, ...] = (match_id, PARSE_CLAIM_TTL)
+    else:
+        candidates = """
+                        select id
+                        from public.matches_to_download
+                        where status in ('downloaded', 'processed')
+                          and coach_tip is null
+                          and (parse_claimed_at is null
+                               or parse_claimed_at < now() - %s * interval '1 second')
+                        order by id asc
+                        limit %s
+                        for update skip locked
+        """
+        params = (PARSE_CLAIM_TTL, limit)
+    # The lock sits in its own subquery: FOR UPDATE cannot be applied to the
+    # nullable side of the users join.
+    cursor.execute(
+        f"""
+        with claimed as (
+            update public.matches_to_download m
+            set parse_claimed_at = now()
+            where m.id in ({candidates})
+            returning m.id, m.user_id, m.file_path
         )
-        row = cursor.fetchone()
-        return [row] if row else []
+        select c.id,
+               c.user_id,
+               c.file_path,
+               u.username,
+               u.language,
+               u.coach_style
+        from claimed c
+        left join public.users u
+            on u.steam_id = c.user_id
+        order by c.id asc
+        """,
+        params,
+    )
+    return cursor.fetchall()
+
 
+def release_claims(cursor: RealDictCursor, match_ids: Sequence[int]) -> None:
+    """Drop the parse claim on matches that should be retried right away."""
+    if not match_ids:
+        return
     cursor.execute(
         """
-                select m.id,
-                       m.user_id,
-                       m.file_path,
-                       u.username,
-                       u.language,
-                       u.coach_style
-                from public.matches_to_download m
-                left join public.users u
-                    on u.steam_id = m.user_id
-                where m.status in ('downloaded', 'processed')
-                    and m.coach_tip is null
-                order by m.id asc
-                limit %s
+        update public.matches_to_download
+        set parse_claimed_at = null
+        where id = any(%s::bigint[])
         """,
-        (limit,),
+        (list(match_ids),),
     )
-    return cursor.fetchall()
 
 
-def mark_parsed(
-    cursor: RealDictCursor,
-    match_id: int,
-    tip: str,
-    tip_image_url: Optional[str] = None,
-    tip_text_image_url: Optional[str] = None,
-) -> bool:
-    """Write coach tip only if no tip exists yet. Returns True if written."""
+def lock_unparsed_match(cursor: RealDictCursor, match_id: int) -> bool:
+    """Lock the match row if it still needs a coach tip.
+
+    Returns False when another process has already finished the match, so the
+    caller can leave its stats alone.
+    """
     cursor.execute(
         """
-        update public.matches_to_download
-        set coach_tip = %s,
-            tip_image_url = %s,
-            tip_text_image_url = %s,
-            tip_sent = false,
-            status = 'processed'
+        select 1
+        from public.matches_to_download
         where id = %s
           and coach_tip is null
           and status not in ('notified')
+        for update
         """,
-        (tip, tip_image_url, tip_text_image_url, match_id),
+        (match_id,),
     )
-    return cursor.rowcount > 0
+    return cursor.fetchone() is not None
+
 
+def mark_parsed_batch(
+    cursor: RealDictCursor,
+    rows: Sequence[Tuple[int, str, Optional[str], Optional[str]]],
+) -> Set[int]:
+    """Write coach tips for a batch of matches in one statement.
 
-def mark_error(cursor: RealDictCursor, match_id: int, reason: str) -> None:
+    ``rows`` holds ``(match_id, tip, tip_image_url, tip_text_image_url)``.
+    A tip is only written if none exists yet; returns the ids that were written.
+    """
+    if not rows:
+        return set()
+    written = execute_values(
+        cursor,
+        """
+        update public.matches_to_download m
+        set coach_tip = v.tip,
+            tip_image_url = v.tip_image_url,
+            tip_text_image_url = v.tip_text_image_url,
+            tip_sent = false,
+            status = 'processed',
+            parse_claimed_at = null
+        from (values %s) as v(id, tip, tip_image_url, tip_text_image_url)
+        where m.id = v.id
+          and m.coach_tip is null
+          and m.status not in ('notified')
+        returning m.id
+        """,
+        rows,
+        template="(%s::bigint, %s::text, %s::text, %s::text)",
+        page_size=len(rows),
+        fetch=True,
+    )
+    return {int(row["id"]) for row in written}
+
+
+def mark_error_batch(cursor: RealDictCursor, failures: Sequence[Tuple[int, str]]) -> None:
+    """Flag a batch of matches as failed; ``failures`` holds ``(match_id, reason)``."""
+    if not failures:
+        return
     cursor.execute(
         """
         update public.matches_to_download
-        set status = 'error'
-        where id = %s
+        set status = 'error',
+            parse_claimed_at = null
+        where id = any(%s::bigint[])
         """,
-        (match_id,),
+        ([match_id for match_id, _ in failures],),
     )
-    print(f"Match {match_id} failed: {reason}")
+    for match_id, reason in failures:
+        print(f"Match {match_id} failed: {reason}")
 
 
 CLEANUP_INTERVAL = int(os.getenv("CLEANUP_INTERVAL", "300"))  # seconds between cleanup runs
 
 
-def cleanup_demo_files(pool) -> int:
+def cleanup_demo_files(pool: ThreadedConnectionPool) -> int:
     """Delete demo files for matches that are fully processed (notified).
 
     Only deletes when:
@@ -164,37 +354,131 @@ def cleanup_demo_files(pool) -> int:
 
     Returns the number of files deleted.
     """
-    conn = pool.connect()
     deleted = 0
-    try:
-        db_conn = conn.driver_connection
-        with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(
-                """
-                select id, file_path
-                from public.matches_to_download
-                where status = 'notified'
-                  and tip_sent = true
-                  and file_path is not null
-                """
+    with checkout(pool) as db_conn, db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            select id, file_path
+            from public.matches_to_download
+            where status = 'notified'
+              and tip_sent = true
+              and file_path is not null
+            """
+        )
+        rows = cursor.fetchall()
+        for row in rows:
+            fpath = row.get("file_path")
+            if fpath and os.path.exists(fpath):
+                try:
+                    os.remove(fpath)
+                    deleted += 1
+                except OSError as exc:
+                    log(f"Failed to delete {fpath}: {exc}")
+    return deleted
+
+
+class MatchListener:
+    """Blocks the idle daemon until a match is ready to parse.
+
+    Holds its own autocommit connection LISTENing on MATCHES_READY_CHANNEL.
+    If LISTEN is unavailable or the connection drops, ``wait`` falls back to
+    sleeping PARSE_POLL_INTERVAL and retries the connection with exponential
+    back-off, up to LISTEN_RETRY_MAX_SECONDS apart.
+    """
+
+    def __init__(self, db_url: str) -> None:
+        self.db_url = db_url
+        self.conn: Optional[Any] = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def _connect(self) -> bool:
+        now = time.monotonic()
+        if now < self.retry_at:
+            return False
+        conn = None
+        try:
+            conn = psycopg2.connect(self.db_url)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"listen {MATCHES_READY_CHANNEL}")
+        except psycopg2.Error as exc:
+            if conn is not None:
+                conn.close()
+            # Only the first failure in a row is logged.
+            if not self.failures:
+                log(f"LISTEN {MATCHES_READY_CHANNEL} unavailable ({exc}); polling instead.")
+            self.failures += 1
+            self.retry_at = now + min(
+                LISTEN_RETRY_MAX_SECONDS, PARSE_POLL_INTERVAL * 2 ** self.failures
             )
-            rows = cursor.fetchall()
-            for row in rows:
-                fpath = row.get("file_path")
-                if fpath and os.path.exists(fpath):
-                    try:
-                        os.remove(fpath)
-                        deleted += 1
-                    except OSError as exc:
-                        log(f"Failed to delete {fpath}: {exc}")
+            return False
+        if self.failures:
+            log(f"LISTEN {MATCHES_READY_CHANNEL} restored.")
+            self.failures = 0
+        self.conn = conn
+        return True
+
+    def close(self) -> None:
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+            self.conn = None
+
+    def wait(self, timeout: float) -> None:
+        if self.conn is None and not self._connect():
+            time.sleep(PARSE_POLL_INTERVAL)
+            return
+        try:
+            if select.select([self.conn], [], [], timeout)[0]:
+                self.conn.poll()
+                # One fetch drains every pending match, however many
+                # notifications arrived.
+                self.conn.notifies.clear()
+        except (psycopg2.Error, OSError) as exc:
+            log(f"Match listener dropped ({exc}); reconnecting.")
+            self.close()
+
+
+def demo_file_problem(file_path: Optional[str]) -> Optional[str]:
+    """Why the demo at ``file_path`` can't be parsed, or None if it looks usable."""
+    if not file_path:
+        return "missing demo file"
+    try:
+        size = os.stat(file_path).st_size
+    except OSError:
+        return "missing demo file"
+    if size < MIN_DEMO_BYTES:
+        return f"demo file too small ({size} bytes)"
+    return None
+
+
+def prefetch_demo(path: str) -> None:
+    """Ask the kernel to read the demo ahead sequentially.
+
+    parse_stats reads the file twice (DemoParser, then the rich awpy Demo),
+    both from a path, so the readahead hint is the one lever we have.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
     finally:
-        conn.close()
-    return deleted
+        os.close(fd)
 
 
 def extract_match_id_from_path(file_path: str, fallback_id: int) -> int:
     base_name = os.path.basename(file_path)
-    match = re.search(r"(\d+)", base_name)
+    match = _MATCH_ID_RE.search(base_name)
     if match:
         try:
             return int(match.group(1))
@@ -205,7 +489,7 @@ def extract_match_id_from_path(file_path: str, fallback_id: int) -> int:
 
 def extract_map_from_path(file_path: str) -> Optional[str]:
     base_name = os.path.basename(file_path).lower()
-    match = re.search(r"(de_[a-z0-9_]+)", base_name)
+    match = _MAP_NAME_RE.search(base_name)
     if match:
         return match.group(1)
     return None
@@ -228,38 +512,7 @@ def insert_match_row(
 ) -> int:
     match_id_value = match_meta.get("match_id", fallback_match_id)
     match_id_text = str(match_id_value)
-    cursor.execute(
-        """
-        select id from public.matches
-        where match_id::text = %s
-        """,
-        (match_id_text,),
-    )
-    existing = cursor.fetchone()
-    if existing and "id" in existing:
-        cursor.execute(
-            """
-            update public.matches
-            set map_name = coalesce(%s, map_name),
-                score_t = coalesce(%s, score_t),
-                score_ct = coalesce(%s, score_ct),
-                winner = coalesce(%s, winner),
-                duration = coalesce(%s, duration),
-                match_date = coalesce(%s, match_date)
-            where id = %s
-            """,
-            (
-                match_meta.get("map_name"),
-                match_meta.get("score_t"),
-                match_meta.get("score_ct"),
-                match_meta.get("winner"),
-                match_meta.get("duration"),
-                match_meta.get("match_date"),
-                int(existing["id"]),
-            ),
-        )
-        return int(existing["id"])
-
+    # The upsert covers both the new and the existing row in one round-trip.
     cursor.execute(
         """
         insert into public.matches
@@ -290,6 +543,46 @@ def insert_match_row(
     return int(inserted["id"])
 
 
+def copy_rows(
+    cursor: RealDictCursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> None:
+    """Stream ``rows`` into ``table`` with a single COPY ... FROM STDIN.
+
+    Only strings can hold a tab, newline or backslash, so numbers skip the
+    escaping pass and are formatted with a plain ``str``.
+    """
+    lines = [
+        "\t".join([
+            "\\N" if value is None
+            else value.translate(_COPY_ESCAPES) if isinstance(value, str)
+            else str(value)
+            for value in row
+        ])
+        for row in rows
+    ]
+    lines.append("")
+    buffer = io.StringIO("\n".join(lines))
+    cursor.copy_expert(f"copy {table} ({', '.join(columns)}) from stdin", buffer)
+
+
+def text_column(frame: pd.DataFrame, name: str) -> List[Optional[str]]:
+    """``frame[name]`` as a list with NaN turned into None (all None if missing)."""
+    if name not in frame:
+        return [None] * len(frame)
+    column = frame[name].astype(object)
+    return column.where(column.notna(), None).tolist()
+
+
+def number_column(frame: pd.DataFrame, name: str, dtype: str) -> List[Any]:
+    """``frame[name]`` coerced to ``dtype``, with unparseable values as 0."""
+    if name not in frame:
+        return [0] * len(frame)
+    return pd.to_numeric(frame[name], errors="coerce").fillna(0).astype(dtype).tolist()
+
+
 def insert_player_stats(
     cursor: RealDictCursor,
     match_row_id: int,
@@ -304,35 +597,36 @@ def insert_player_stats(
         """,
         (match_row_id,),
     )
-    rows = []
-    for player in player_stats:
-        rows.append(
-            (
-                match_row_id,
-                str(player.get("steam_id") or ""),
-                player.get("player_name"),
-                player.get("team_side"),
-                player.get("player_team"),
-                int(player.get("kills") or 0),
-                int(player.get("deaths") or 0),
-                int(player.get("assists") or 0),
-                float(player.get("adr") or 0.0),
-                float(player.get("hs_percent") or 0.0),
-                int(player.get("opening_kills") or 0),
-                int(player.get("opening_deaths") or 0),
-                int(player.get("trade_kills") or 0),
-                int(player.get("utility_damage") or 0),
-            )
-        )
-
-    cursor.executemany(
-        """
-        insert into public.player_match_stats
-        (match_id, steam_id, player_name, team_side, player_team, kills, deaths, assists, adr,
-         hs_percent, opening_kills, opening_deaths, trade_kills, utility_damage)
-        values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        rows,
+    # Coerce each column once in pandas instead of per row/field in Python.
+    # dtype=object keeps the raw values: an int steam_id column with a None in
+    # it would otherwise become float64 and lose digits.
+    frame = pd.DataFrame(player_stats, dtype=object)
+    columns = [
+        [match_row_id] * len(frame),
+        [str(value or "") for value in text_column(frame, "steam_id")],
+        text_column(frame, "player_name"),
+        text_column(frame, "team_side"),
+        text_column(frame, "player_team"),
+        number_column(frame, "kills", "int64"),
+        number_column(frame, "deaths", "int64"),
+        number_column(frame, "assists", "int64"),
+        number_column(frame, "adr", "float64"),
+        number_column(frame, "hs_percent", "float64"),
+        number_column(frame, "opening_kills", "int64"),
+        number_column(frame, "opening_deaths", "int64"),
+        number_column(frame, "trade_kills", "int64"),
+        number_column(frame, "utility_damage", "int64"),
+    ]
+
+    copy_rows(
+        cursor,
+        "public.player_match_stats",
+        (
+            "match_id", "steam_id", "player_name", "team_side", "player_team", "kills",
+            "deaths", "assists", "adr", "hs_percent", "opening_kills", "opening_deaths",
+            "trade_kills", "utility_damage",
+        ),
+        zip(*columns),
     )
 
 
@@ -369,63 +663,79 @@ def insert_rounds(
             )
         )
 
-    cursor.executemany(
-        """
-        insert into public.rounds
-        (match_id, round_number, winner_side, reason, ct_score, t_score)
-        values (%s, %s, %s, %s, %s, %s)
-        """,
+    copy_rows(
+        cursor,
+        "public.rounds",
+        ("match_id", "round_number", "winner_side", "reason", "ct_score", "t_score"),
         rows,
     )
 
 
-class RateLimiter:
-    def __init__(self, max_calls: int, period_seconds: int) -> None:
-        self.max_calls = max_calls
-        self.period_seconds = period_seconds
-        self.lock = threading.Lock()
-        self.calls: Deque[float] = deque()
+class AimdLimiter:
+    """Caps concurrent AI requests with additive-increase/multiplicative-decrease.
+
+    Each successful request raises the cap by one (up to ``max_limit``); a
+    rate-limited one halves it (down to ``min_limit``) and holds back new
+    requests until the provider's retry-after has passed. Any other failure
+    only frees its slot.
+    """
+
+    def __init__(self, min_limit: int, max_limit: int) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.cond = threading.Condition()
 
     def acquire(self) -> None:
-        while True:
-            with self.lock:
-                now = time.time()
-                while self.calls and now - self.calls[0] >= self.period_seconds:
-                    self.calls.popleft()
-                if len(self.calls) < self.max_calls:
-                    self.calls.append(now)
+        with self.cond:
+            while True:
+                wait_for = self.resume_at - time.time()
+                if wait_for <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
                     return
-                sleep_for = self.period_seconds - (now - self.calls[0])
-            if sleep_for > 0:
-                time.sleep(sleep_for)
+                self.cond.wait(wait_for if wait_for > 0 else None)
+
+    def release(
+        self, throttled: bool, retry_after: Optional[int] = None, success: bool = True
+    ) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * 0.5)
+                self.resume_at = max(
+                    self.resume_at, time.time() + (retry_after or QUOTA_BACKOFF_SECONDS)
+                )
+            elif success:
+                self.limit = min(self.max_limit, self.limit + 1)
+            self.cond.notify_all()
 
 
 def is_quota_error(error: Exception) -> bool:
-    return "RESOURCE_EXHAUSTED" in str(error)
+    message = str(error)
+    return (
+        "RESOURCE_EXHAUSTED" in message
+        or "rate_limit_exceeded" in message
+        or "Error code: 429" in message
+    )
 
 
 def parse_retry_after_seconds(error: Exception) -> Optional[int]:
-    message = str(error)
-    for token in ("retryDelay", "retry in"):
-        if token in message:
-            break
-    else:
-        return None
-
-    for part in message.replace("'", " ").replace("\"", " ").split():
-        if part.endswith("s") and part[:-1].replace(".", "", 1).isdigit():
-            try:
-                return max(1, int(float(part[:-1])))
-            except ValueError:
-                continue
-    return None
+    match = _RETRY_RE.search(str(error))
+    return max(1, int(float(match.group(1)))) if match else None
 
 
-def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+def set_rate_limiter(limiter: Optional[TokenBucket]) -> None:
     global _rate_limiter
     _rate_limiter = limiter
 
 
+def set_ai_limiter(limiter: Optional[AimdLimiter]) -> None:
+    global _ai_limiter
+    _ai_limiter = limiter
+
+
 def _steamid_col_to_str(series: pd.Series) -> pd.Series:
     """Convert a pandas column of Steam IDs (int64/uint64/float64/str) to canonical string form.
 
@@ -442,9 +752,512 @@ def _steamid_col_to_str(series: pd.Series) -> pd.Series:
     return series.apply(_to_str)
 
 
+def _normalized_ids(series: pd.Series) -> pd.Series:
+    """Strip a Steam ID column once and store it as a Categorical.
+
+    Equality tests and counts on the result work on the integer codes instead
+    of re-comparing strings.
+    """
+    return series.astype(str).str.strip().astype("category")
+
+
+def _id_mask(ids: pd.Series, value: Optional[str]) -> np.ndarray:
+    """Boolean mask of ``ids == value`` for a ``_normalized_ids`` Series."""
+    categories = ids.cat.categories
+    if value is None or value not in categories:
+        return np.zeros(len(ids), dtype=bool)
+    return ids.cat.codes.to_numpy() == categories.get_loc(value)
+
+
+def _observed_ids(ids: pd.Series, raw: pd.Series) -> Set[str]:
+    """Distinct values of a ``_normalized_ids`` Series, skipping rows where ``raw`` is missing."""
+    return set(ids[raw.notna()].unique())
+
+
+def _shared_id_codes(*columns: pd.Series) -> Tuple[pd.Index, List[np.ndarray]]:
+    """Re-code several ``_normalized_ids`` Series against one shared index.
+
+    Returns the player index and, per column, an int64 array of positions
+    into it (-1 for missing IDs), so IDs from different columns compare as
+    plain integers.
+    """
+    players = columns[0].cat.categories
+    for column in columns[1:]:
+        players = players.union(column.cat.categories)
+    players = players[[normalize_id(player) is not None for player in players]]
+    codes = []
+    for column in columns:
+        raw = column.cat.codes.to_numpy().astype(np.int64)
+        remapped = np.full(len(raw), -1, dtype=np.int64)
+        present = raw >= 0
+        remapped[present] = players.get_indexer(column.cat.categories)[raw[present]]
+        codes.append(remapped)
+    return players, codes
+
+
+def _count_trade_kills(
+    ticks: np.ndarray,
+    attacker_codes: np.ndarray,
+    victim_codes: np.ndarray,
+    team_codes: np.ndarray,
+    window: float,
+) -> np.ndarray:
+    """Count trade kills per player code.
+
+    Kill ``i`` is a trade when an earlier kill ``j`` no more than ``window``
+    ticks before it was made by i's victim against a teammate of i's attacker.
+    ``ticks`` must be sorted; ``team_codes`` maps player code -> 0 (CT),
+    1 (T) or -1 (unknown).
+    """
+    counts = np.zeros(len(team_codes), dtype=np.int64)
+    kill_count = len(ticks)
+    if kill_count == 0:
+        return counts
+    positions = np.arange(kill_count, dtype=np.int64)
+    stride = kill_count + 1
+
+    # Earlier kills keyed by (killer, team of the player killed), with the
+    # kill's position folded in so each key's kills stay in order.
+    killed_team = team_codes[victim_codes]
+    candidate = killed_team >= 0
+    composite = np.sort(
+        ((attacker_codes * 2 + killed_team) * stride + positions)[candidate]
+    )
+
+    # For kill i, look for key (i's victim, i's attacker team) at a position
+    # in [first kill inside the window, i).
+    attacker_team = team_codes[attacker_codes]
+    query_key = victim_codes * 2 + attacker_team
+    window_start = np.searchsorted(ticks, ticks - window, side="left")
+    hit_at = np.searchsorted(composite, query_key * stride + window_start, side="left")
+    in_range = hit_at < len(composite)
+    in_range[in_range] = (
+        composite[hit_at[in_range]] < (query_key * stride + positions)[in_range]
+    )
+    trades = in_range & (attacker_team >= 0)
+    np.add.at(counts, attacker_codes[trades], 1)
+    return counts
+
+
+def _bipartition(
+    attacker_codes: np.ndarray, victim_codes: np.ndarray, player_count: int
+) -> np.ndarray:
+    """Split players into two teams by treating every kill as a cross-team edge.
+
+    Returns an int8 array indexed by player code: 0 or 1 for the two sides of
+    each connected component (the first player seen in a component gets 0),
+    -1 for players without kills. Codes of -1 in the inputs are ignored.
+    """
+    side = np.full(player_count, -1, dtype=np.int8)
+    valid = (attacker_codes >= 0) & (victim_codes >= 0)
+    if not valid.any():
+        return side
+    sources = np.concatenate((attacker_codes[valid], victim_codes[valid]))
+    targets = np.concatenate((victim_codes[valid], attacker_codes[valid]))
+    order = np.argsort(sources, kind="stable")
+    targets = targets[order]
+    # CSR adjacency: neighbours of p are targets[indptr[p]:indptr[p + 1]].
+    indptr = np.searchsorted(sources[order], np.arange(player_count + 1))
+
+    # Seed components in order of first appearance in the kill feed.
+    seen = np.column_stack((attacker_codes[valid], victim_codes[valid])).ravel()
+    _, first_seen = np.unique(seen, return_index=True)
+    for seed in seen[np.sort(first_seen)]:
+        if side[seed] >= 0:
+            continue
+        side[seed] = 0
+        frontier = np.array([seed])
+        while frontier.size:
+            starts = indptr[frontier]
+            degrees = indptr[frontier + 1] - starts
+            offsets = np.arange(degrees.sum()) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+            neighbours = targets[np.repeat(starts, degrees) + offsets]
+            parent_side = np.repeat(side[frontier], degrees)
+            unvisited = side[neighbours] < 0
+            frontier, first = np.unique(neighbours[unvisited], return_index=True)
+            side[frontier] = 1 - parent_side[unvisited][first]
+    return side
+
+
+# The normalizers below see the same few steam IDs, names and side values
+# thousands of times per demo, so their results are memoized. typed=True keeps
+# e.g. 3 and 3.0 apart, since they normalize to different IDs.
+@lru_cache(maxsize=4096, typed=True)
+def normalize_side(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return _SIDE_BY_NAME.get(value.strip().upper())
+    if isinstance(value, (int, float)):
+        return _SIDE_BY_TEAM_NUM.get(int(value))
+    return None
+
+
+@lru_cache(maxsize=4096, typed=True)
+def normalize_id(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value_str = str(value).strip()
+    if not value_str or value_str.lower() in {"nan", "none", "null"}:
+        return None
+    return value_str
+
+
+@lru_cache(maxsize=4096, typed=True)
+def normalize_name(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    name = str(value).strip()
+    if not name or name.lower() in {"nan", "none", "null"}:
+        return None
+    return name
+
+
+@lru_cache(maxsize=4096, typed=True)
+def normalize_name_key(value: Any) -> Optional[str]:
+    name = normalize_name(value)
+    if not name:
+        return None
+    key = _NON_ALNUM_RE.sub("", name).lower()
+    return key or None
+
+
+def find_col(df, candidates):
+    # ``df`` may also be a prebuilt set of column names (see parse_stats);
+    # set membership is much cheaper than DataFrame.columns lookups.
+    columns = df.columns if isinstance(df, pd.DataFrame) else df
+    for name in candidates:
+        if name in columns:
+            return name
+    return None
+
+
+def normalize_reason(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        reason_value = value.strip()
+        return reason_value or None
+    if isinstance(value, (int, float)):
+        return str(int(value))
+    return str(value)
+
+
+def parse_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_side(entry: Dict[str, Any], prefix: str) -> Optional[str]:
+    return (
+        normalize_side(entry.get(f"{prefix}Side"))
+        or normalize_side(entry.get(f"{prefix}Team"))
+        or normalize_side(entry.get(f"{prefix}TeamName"))
+        or normalize_side(entry.get(f"{prefix}TeamSide"))
+    )
+
+
+def starting_ct_plays_as(round_num: int, mr: int = 12) -> str:
+    """Return the side the 'starting-CT team' is playing on in a given round.
+
+    CS2 uses MR12 (Competitive) or MR8 (Wingman).
+    - Rounds 1..mr           → first half (starting CT stays CT)
+    - Rounds mr+1..mr*2      → second half (starting CT plays T)
+    - Overtime MR3: each OT has two 3-round halves that alternate.
+    """
+    regulation = mr * 2
+    if round_num <= mr:
+        return "CT"
+    elif round_num <= regulation:
+        return "T"
+    else:
+        # Overtime: MR3 (6 rounds per OT, sides swap every 3)
+        ot_round_0 = round_num - regulation - 1  # 0-indexed within OT
+        ot_half = ot_round_0 // 3
+        return "CT" if ot_half % 2 == 0 else "T"
+
+
+def extract_time_value(entry: Dict[str, Any]) -> float:
+    for key in ("tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"):
+        if key in entry and entry[key] is not None:
+            try:
+                return float(entry[key])
+            except (TypeError, ValueError):
+                continue
+    return float("inf")
+
+
+def extract_player_name(entry: Dict[str, Any], prefix: str) -> Optional[str]:
+    for key in (
+        f"{prefix}Name",
+        f"{prefix}_name",
+        f"{prefix}PlayerName",
+        f"{prefix}playerName",
+    ):
+        if key in entry:
+            return normalize_name(entry.get(key))
+    return None
+
+
+def extract_player_id(entry: Dict[str, Any], prefix: str) -> Optional[str]:
+    for key in (
+        f"{prefix}SteamID",
+        f"{prefix}SteamId",
+        f"{prefix}steamid",
+        f"{prefix}_steamid",
+        f"{prefix}SteamID64",
+    ):
+        if key in entry:
+            return normalize_id(entry.get(key))
+    return None
+
+
+def categorize_item(item_name: str) -> Optional[str]:
+    # Knives and unknown items have no category.
+    return _WEAPON_CATEGORY.get(item_name.strip().lower())
+
+
+def is_utility_weapon(item_name: Optional[str]) -> bool:
+    if not item_name:
+        return False
+    return item_name.strip().lower() in _UTILITY_WEAPONS
+
+
+def utility_weapon_mask(weapons: pd.Series) -> np.ndarray:
+    """Vectorized ``is_utility_weapon`` over a weapon-name column.
+
+    Each distinct name is classified once and the result is indexed by
+    category code; missing values map to False.
+    """
+    weapons = weapons.astype("category")
+    is_utility = [is_utility_weapon(str(name)) for name in weapons.cat.categories]
+    # Trailing False catches the -1 code of missing values.
+    return np.array(is_utility + [False], dtype=bool)[weapons.cat.codes.to_numpy()]
+
+
+def count_buy_types(
+    purchases: pd.DataFrame, round_key: str, team_size: int
+) -> Dict[str, Dict[str, int]]:
+    """Count full/eco/force buys per side.
+
+    ``purchases`` has one row per purchase with ``round_key``, ``team_norm``
+    and ``item_cat`` columns. Each (round, side) gets one label from its
+    primary count; per side, the labels are keyed in the order they first
+    appear round by round.
+    """
+    buy_counts: Dict[str, Dict[str, int]] = {"CT": {}, "T": {}}
+    # Sorted by round, then side, like iterating the (round, side) groups.
+    primary_counts = (
+        purchases["item_cat"]
+        .eq("primary")
+        .groupby([purchases[round_key], purchases["team_norm"]])
+        .sum()
+    )
+    primary_values = primary_counts.to_numpy()
+    buy_types = pd.Series(
+        np.select(
+            [primary_values >= team_size, primary_values == 0],
+            ["full", "eco"],
+            default="force",
+        ),
+        index=primary_counts.index,
+    )
+    for team_value, team_buys in buy_types.groupby(level=1, sort=False):
+        if team_value not in buy_counts:
+            continue
+        counts = team_buys.value_counts()
+        buy_counts[team_value] = {
+            buy_type: int(counts[buy_type]) for buy_type in pd.unique(team_buys.to_numpy())
+        }
+    return buy_counts
+
+
+def attach_round_numbers(
+    deaths_source: pd.DataFrame,
+    round_key: Optional[str],
+    time_key: Optional[str],
+    rounds_source: pd.DataFrame,
+    rounds_round_key: Optional[str],
+    rounds_time_key: Optional[str],
+) -> tuple[pd.DataFrame, Optional[str]]:
+    if deaths_source.empty:
+        return deaths_source, round_key
+    # assign() swaps in the coerced column without a full .copy() of the
+    # source frame first.
+    if round_key:
+        deaths_local = deaths_source.assign(
+            **{round_key: pd.to_numeric(deaths_source[round_key], errors="coerce")}
+        ).dropna(subset=[round_key])
+        if not deaths_local.empty:
+            return deaths_local, round_key
+    if not time_key or rounds_source.empty or not rounds_time_key:
+        return deaths_source, None
+    deaths_local = deaths_source.assign(
+        **{time_key: pd.to_numeric(deaths_source[time_key], errors="coerce")}
+    ).dropna(subset=[time_key]).sort_values(time_key)
+    rounds_local = rounds_source[[rounds_time_key]].assign(
+        **{rounds_time_key: pd.to_numeric(rounds_source[rounds_time_key], errors="coerce")}
+    )
+    rounds_local = rounds_local.dropna(subset=[rounds_time_key]).sort_values(rounds_time_key)
+    rounds_local = rounds_local.reset_index(drop=True)
+    rounds_local["round_index"] = rounds_local.index + 1
+    if deaths_local.empty or rounds_local.empty:
+        return deaths_source, None
+    deaths_local = pd.merge_asof(
+        deaths_local,
+        rounds_local,
+        left_on=time_key,
+        right_on=rounds_time_key,
+        direction="forward",
+    )
+    round_key = "round_index"
+    return deaths_local.dropna(subset=[round_key]), round_key
+
+
+def record_player(
+    players_by_id: Dict[str, str],
+    ids_by_name: Dict[str, str],
+    name: Optional[str],
+    steamid: Optional[str],
+) -> None:
+    normalized_id = normalize_id(steamid)
+    normalized_name = normalize_name(name)
+    if normalized_id:
+        existing_name = players_by_id.get(normalized_id)
+        if not existing_name and normalized_name:
+            players_by_id[normalized_id] = normalized_name
+        elif normalized_id not in players_by_id:
+            players_by_id[normalized_id] = normalized_name or ""
+    if normalized_name and normalized_id:
+        name_key = normalize_name_key(normalized_name)
+        if name_key and name_key not in ids_by_name:
+            ids_by_name[name_key] = normalized_id
+
+
+def add_player_records(player_records: List[Tuple[Any, Any, Any]], players: Any) -> None:
+    if isinstance(players, dict):
+        players = players.values()
+    for player in players:
+        if isinstance(player, dict):
+            player_records.append(
+                (
+                    player.get("steamID")
+                    or player.get("steamId")
+                    or player.get("steamid"),
+                    player.get("name")
+                    or player.get("playerName")
+                    or player.get("username"),
+                    player.get("team")
+                    or player.get("teamNum")
+                    or player.get("teamnum")
+                    or player.get("team_side")
+                    or player.get("teamSide")
+                    or player.get("side"),
+                )
+            )
+
+
+def collect_from_events(
+    df: pd.DataFrame, players_by_id: Dict[str, str], ids_by_name: Dict[str, str]
+) -> None:
+    if df.empty:
+        return
+    for col in df.columns:
+        col_lower = col.lower()
+        if "steamid" not in col_lower:
+            continue
+        if "steamid" in col:
+            prefix = col.rsplit("steamid", 1)[0]
+        else:
+            prefix = col.rsplit("SteamID", 1)[0]
+        name_candidates = [
+            f"{prefix}name",
+            f"{prefix}Name",
+            f"{prefix}_name",
+            f"{prefix}_playername",
+            f"{prefix}PlayerName",
+        ]
+        name_col = next((c for c in name_candidates if c in df.columns), None)
+        if name_col:
+            for steam_id_value, name_value in df[[col, name_col]].itertuples(
+                index=False, name=None
+            ):
+                record_player(players_by_id, ids_by_name, name_value, steam_id_value)
+        else:
+            for steam_id_value in df[col]:
+                record_player(players_by_id, ids_by_name, None, steam_id_value)
+
+
+class _EventCache:
+    """Parse-once view over a ``DemoParser``.
+
+    ``parser.parse()`` and every ``parse_event`` call walk the demo again, so
+    the full parse and each event frame are memoized per parser instance.
+    """
+
+    def __init__(self, parser: DemoParser) -> None:
+        self._parser = parser
+        self._parsed: Optional[Dict[str, Any]] = None
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._header: Any = None
+        self._header_loaded = False
+
+    @property
+    def parsed(self) -> Dict[str, Any]:
+        if self._parsed is None:
+            data = self._parser.parse() if hasattr(self._parser, "parse") else {}
+            self._parsed = data if isinstance(data, dict) else {}
+        return self._parsed
+
+    def event(self, event_name: str) -> pd.DataFrame:
+        frame = self._frames.get(event_name)
+        if frame is None:
+            frame = self._parser.parse_event(event_name)
+            if frame is None:
+                frame = pd.DataFrame()
+            self._frames[event_name] = frame
+        return frame
+
+    def frame(self, key: str, event_name: str) -> pd.DataFrame:
+        """Prefer the already-parsed ``parsed[key]`` over another pass of the demo."""
+        value = self.parsed.get(key)
+        if isinstance(value, pd.DataFrame):
+            if not value.empty:
+                return value
+        elif isinstance(value, list) and value:
+            return pd.DataFrame(value)
+        return self.event(event_name)
+
+    def first(self, event_names: List[str]) -> pd.DataFrame:
+        """Return the first non-empty frame among ``event_names``."""
+        for event_name in event_names:
+            frame = self.event(event_name)
+            if not frame.empty:
+                return frame
+        return pd.DataFrame()
+
+    @property
+    def header(self) -> Any:
+        if not self._header_loaded:
+            self._header_loaded = True
+            parser = self._parser
+            try:
+                self._header = parser.parse_header()
+            except Exception:
+                self._header = None
+            if self._header is None:
+                self._header = getattr(parser, "header", None)
+            if self._header is None:
+                self._header = getattr(parser, "demo_header", None)
+        return self._header
+
+
 def parse_stats(
     demo_path: str, steam_id: str, match_id: int, player_name: Optional[str] = None
 ) -> Dict[str, Any]:
+    prefetch_demo(demo_path)
     try:
         parser = DemoParser(demo_path, demo_id=str(match_id), parse_rate=128)
     except TypeError:
@@ -590,320 +1403,91 @@ def parse_stats(
             _pos_grouped = _shots_tmp2.groupby(["round_num", "player_steamid"])["player_place"].apply(
                 lambda x: list(x.dropna().unique())
             ).reset_index(name="places")
-            _positions_all: Dict[int, Dict[str, List[str]]] = {}
-            for _, row in _pos_grouped.iterrows():
-                rn = int(row["round_num"])
-                sid = str(row["player_steamid"]).strip()
-                _positions_all.setdefault(rn, {})[sid] = row["places"]
-            positions_per_round = _positions_all  # type: ignore
-        except Exception as _pos_err:
-            print(f"WARNING: positions_per_round computation failed: {_pos_err}")
-            positions_per_round = {}
-
-    # ── Build weapon used per round from shots ──
-    weapon_per_round: Dict[int, Dict[str, str]] = {}  # round → {player_id: primary_weapon}
-    if rich_shots_df is not None and not rich_shots_df.empty:
-        try:
-            _shots_tmp3 = rich_shots_df.copy()
-            _shots_tmp3["player_steamid"] = _steamid_col_to_str(_shots_tmp3["player_steamid"])
-            if "weapon" in _shots_tmp3.columns:
-                _shots_tmp3 = _shots_tmp3[~_shots_tmp3["weapon"].str.contains(
-                    "grenade|flashbang|smokegrenade|decoy|molotov|incgrenade|knife|bayonet|c4",
-                    case=False, na=False
-                )]
-            _wpn_grouped = _shots_tmp3.groupby(["round_num", "player_steamid"])["weapon"].agg(
-                lambda x: x.mode().iloc[0] if len(x) > 0 else "unknown"
-            ).reset_index(name="primary_weapon")
-            for _, row in _wpn_grouped.iterrows():
-                rn = int(row["round_num"])
-                sid = str(row["player_steamid"]).strip()
-                weapon_per_round.setdefault(rn, {})[sid] = str(row["primary_weapon"]).replace("weapon_", "")
-        except Exception as _wpn_err:
-            print(f"WARNING: weapon_per_round computation failed: {_wpn_err}")
-            weapon_per_round = {}
-
-    # ── Build trade kill data from rich kills ──
-    trade_kills_rounds: List[Dict[str, Any]] = []
-    got_traded_rounds: List[Dict[str, Any]] = []
-    # Will be computed once target_steam_id is determined
-
-    # ── Build bomb events per round ──
-    bomb_events_per_round: Dict[int, List[Dict[str, str]]] = {}  # round → [{event, player, bombsite}]
-    if rich_bomb_df is not None and not rich_bomb_df.empty:
-        try:
-            for _, row in rich_bomb_df.iterrows():
-                rn = row.get("round_num")
-                if not rn:
-                    continue
-                event = str(row.get("event", "")).strip()
-                if event not in ("planted", "defused", "exploded"):
-                    continue
-                bomb_events_per_round.setdefault(int(rn), []).append({
-                    "event": event,
-                    "player": str(row.get("name", "")).strip(),
-                    "player_steamid": str(row.get("steamid", "")).strip(),
-                    "bombsite": str(row.get("bombsite", "")).strip() or "?",
-                })
-        except Exception:
-            bomb_events_per_round = {}
-
-    def find_col(df, candidates):
-        for name in candidates:
-            if name in df.columns:
-                return name
-        return None
-
-    def normalize_side(value: Any) -> Optional[str]:
-        if value is None:
-            return None
-        if isinstance(value, str):
-            value_upper = value.strip().upper()
-            if value_upper in {"CT", "COUNTER-TERRORIST", "COUNTERTERRORIST"}:
-                return "CT"
-            if value_upper in {"T", "TERRORIST"}:
-                return "T"
-        if isinstance(value, (int, float)):
-            if int(value) == 3:
-                return "CT"
-            if int(value) == 2:
-                return "T"
-        return None
-
-    def normalize_reason(value: Any) -> Optional[str]:
-        if value is None:
-            return None
-        if isinstance(value, str):
-            reason_value = value.strip()
-            return reason_value or None
-        if isinstance(value, (int, float)):
-            return str(int(value))
-        return str(value)
-
-    def parse_int(value: Any) -> Optional[int]:
-        if value is None:
-            return None
-        try:
-            return int(float(value))
-        except (TypeError, ValueError):
-            return None
-
-    def extract_side(entry: Dict[str, Any], prefix: str) -> Optional[str]:
-        return (
-            normalize_side(entry.get(f"{prefix}Side"))
-            or normalize_side(entry.get(f"{prefix}Team"))
-            or normalize_side(entry.get(f"{prefix}TeamName"))
-            or normalize_side(entry.get(f"{prefix}TeamSide"))
-        )
-
-    def starting_ct_plays_as(round_num: int, mr: int = 12) -> str:
-        """Return the side the 'starting-CT team' is playing on in a given round.
-
-        CS2 uses MR12 (Competitive) or MR8 (Wingman).
-        - Rounds 1..mr           → first half (starting CT stays CT)
-        - Rounds mr+1..mr*2      → second half (starting CT plays T)
-        - Overtime MR3: each OT has two 3-round halves that alternate.
-        """
-        regulation = mr * 2
-        if round_num <= mr:
-            return "CT"
-        elif round_num <= regulation:
-            return "T"
-        else:
-            # Overtime: MR3 (6 rounds per OT, sides swap every 3)
-            ot_round_0 = round_num - regulation - 1  # 0-indexed within OT
-            ot_half = ot_round_0 // 3
-            return "CT" if ot_half % 2 == 0 else "T"
-
-    def extract_time_value(entry: Dict[str, Any]) -> float:
-        for key in ("tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"):
-            if key in entry and entry[key] is not None:
-                try:
-                    return float(entry[key])
-                except (TypeError, ValueError):
-                    continue
-        return float("inf")
-
-    def normalize_id(value: Any) -> Optional[str]:
-        if value is None:
-            return None
-        value_str = str(value).strip()
-        if not value_str or value_str.lower() in {"nan", "none", "null"}:
-            return None
-        return value_str
-
-    def normalize_name(value: Any) -> Optional[str]:
-        if value is None:
-            return None
-        name = str(value).strip()
-        if not name or name.lower() in {"nan", "none", "null"}:
-            return None
-        return name
-
-    def normalize_name_key(value: Any) -> Optional[str]:
-        name = normalize_name(value)
-        if not name:
-            return None
-        key = "".join(char.lower() for char in name if char.isalnum())
-        return key or None
-
-    def extract_player_name(entry: Dict[str, Any], prefix: str) -> Optional[str]:
-        for key in (
-            f"{prefix}Name",
-            f"{prefix}_name",
-            f"{prefix}PlayerName",
-            f"{prefix}playerName",
-        ):
-            if key in entry:
-                return normalize_name(entry.get(key))
-        return None
-
-    def extract_player_id(entry: Dict[str, Any], prefix: str) -> Optional[str]:
-        for key in (
-            f"{prefix}SteamID",
-            f"{prefix}SteamId",
-            f"{prefix}steamid",
-            f"{prefix}_steamid",
-            f"{prefix}SteamID64",
-        ):
-            if key in entry:
-                return normalize_id(entry.get(key))
-        return None
-
-    def parse_event_with_fallback(parser_obj: DemoParser, event_names: List[str]) -> pd.DataFrame:
-        for event_name in event_names:
-            df = parser_obj.parse_event(event_name)
-            if df is not None and not df.empty:
-                return df
-        return pd.DataFrame()
-
-    def categorize_item(item_name: str) -> Optional[str]:
-        name = item_name.strip().lower()
-        if not name:
-            return None
-        rifles = {
-            "ak47",
-            "m4a1",
-            "m4a1_silencer",
-            "m4a4",
-            "aug",
-            "sg556",
-            "galilar",
-            "famas",
-            "awp",
-            "ssg08",
-            "g3sg1",
-            "scar20",
-        }
-        smgs = {"mac10", "mp9", "mp7", "mp5sd", "ump45", "p90", "bizon"}
-        heavies = {"nova", "xm1014", "mag7", "m249", "negev", "sawedoff"}
-        pistols = {
-            "glock",
-            "hkp2000",
-            "usp_silencer",
-            "p250",
-            "fiveseven",
-            "tec9",
-            "cz75a",
-            "deagle",
-            "revolver",
-            "elite",
-        }
-        utility = {
-            "hegrenade",
-            "flashbang",
-            "smokegrenade",
-            "molotov",
-            "incgrenade",
-            "decoy",
-        }
-        if name in rifles:
-            return "primary"
-        if name in smgs:
-            return "primary"
-        if name in heavies:
-            return "primary"
-        if name in pistols:
-            return "pistol"
-        if name in utility:
-            return "utility"
-        if name.endswith("knife") or name.startswith("knife"):
-            return None
-        return None
+            _positions_all: Dict[int, Dict[str, List[str]]] = {}
+            for _, row in _pos_grouped.iterrows():
+                rn = int(row["round_num"])
+                sid = str(row["player_steamid"]).strip()
+                _positions_all.setdefault(rn, {})[sid] = row["places"]
+            positions_per_round = _positions_all  # type: ignore
+        except Exception as _pos_err:
+            print(f"WARNING: positions_per_round computation failed: {_pos_err}")
+            positions_per_round = {}
 
-    def is_utility_weapon(item_name: Optional[str]) -> bool:
-        if not item_name:
-            return False
-        utility_items = {
-            "hegrenade",
-            "flashbang",
-            "smokegrenade",
-            "molotov",
-            "incgrenade",
-            "decoy",
-        }
-        return item_name.strip().lower() in utility_items
-
-    def attach_round_numbers(
-        deaths_source: pd.DataFrame,
-        round_key: Optional[str],
-        time_key: Optional[str],
-        rounds_source: pd.DataFrame,
-        rounds_round_key: Optional[str],
-        rounds_time_key: Optional[str],
-    ) -> tuple[pd.DataFrame, Optional[str]]:
-        if deaths_source.empty:
-            return deaths_source, round_key
-        if round_key:
-            deaths_local = deaths_source.copy()
-            deaths_local[round_key] = pd.to_numeric(deaths_local[round_key], errors="coerce")
-            deaths_local = deaths_local.dropna(subset=[round_key])
-            if not deaths_local.empty:
-                return deaths_local, round_key
-        if not time_key or rounds_source.empty or not rounds_time_key:
-            return deaths_source, None
-        deaths_local = deaths_source.copy()
-        deaths_local[time_key] = pd.to_numeric(deaths_local[time_key], errors="coerce")
-        deaths_local = deaths_local.dropna(subset=[time_key]).sort_values(time_key)
-        rounds_local = rounds_source[[rounds_time_key]].copy()
-        rounds_local[rounds_time_key] = pd.to_numeric(rounds_local[rounds_time_key], errors="coerce")
-        rounds_local = rounds_local.dropna(subset=[rounds_time_key]).sort_values(rounds_time_key)
-        rounds_local = rounds_local.reset_index(drop=True)
-        rounds_local["round_index"] = rounds_local.index + 1
-        if deaths_local.empty or rounds_local.empty:
-            return deaths_source, None
-        deaths_local = pd.merge_asof(
-            deaths_local,
-            rounds_local,
-            left_on=time_key,
-            right_on=rounds_time_key,
-            direction="forward",
-        )
-        round_key = "round_index"
-        return deaths_local.dropna(subset=[round_key]), round_key
+    # ── Build weapon used per round from shots ──
+    weapon_per_round: Dict[int, Dict[str, str]] = {}  # round → {player_id: primary_weapon}
+    if rich_shots_df is not None and not rich_shots_df.empty:
+        try:
+            _shots_tmp3 = rich_shots_df.copy()
+            _shots_tmp3["player_steamid"] = _steamid_col_to_str(_shots_tmp3["player_steamid"])
+            if "weapon" in _shots_tmp3.columns:
+                _shots_tmp3 = _shots_tmp3[~_shots_tmp3["weapon"].str.contains(
+                    "grenade|flashbang|smokegrenade|decoy|molotov|incgrenade|knife|bayonet|c4",
+                    case=False, na=False
+                )]
+            # Most-fired weapon per (round, player); like Series.mode(), ties
+            # go to the alphabetically first weapon.
+            _wpn_counts = _shots_tmp3.groupby(
+                ["round_num", "player_steamid", "weapon"]
+            ).size().reset_index(name="shots")
+            _wpn_top = _wpn_counts.sort_values(
+                ["round_num", "player_steamid", "shots", "weapon"],
+                ascending=[True, True, False, True],
+            ).drop_duplicates(["round_num", "player_steamid"])
+            for rn, sid, weapon in _wpn_top[
+                ["round_num", "player_steamid", "weapon"]
+            ].itertuples(index=False, name=None):
+                weapon_per_round.setdefault(int(rn), {})[str(sid).strip()] = str(weapon).replace("weapon_", "")
+        except Exception as _wpn_err:
+            print(f"WARNING: weapon_per_round computation failed: {_wpn_err}")
+            weapon_per_round = {}
+
+    # ── Build trade kill data from rich kills ──
+    trade_kills_rounds: List[Dict[str, Any]] = []
+    got_traded_rounds: List[Dict[str, Any]] = []
+    # Will be computed once target_steam_id is determined
+
+    # ── Build bomb events per round ──
+    bomb_events_per_round: Dict[int, List[Dict[str, str]]] = {}  # round → [{event, player, bombsite}]
+    if rich_bomb_df is not None and not rich_bomb_df.empty:
+        try:
+            for _, row in rich_bomb_df.iterrows():
+                rn = row.get("round_num")
+                if not rn:
+                    continue
+                event = str(row.get("event", "")).strip()
+                if event not in ("planted", "defused", "exploded"):
+                    continue
+                bomb_events_per_round.setdefault(int(rn), []).append({
+                    "event": event,
+                    "player": str(row.get("name", "")).strip(),
+                    "player_steamid": str(row.get("steamid", "")).strip(),
+                    "bombsite": str(row.get("bombsite", "")).strip() or "?",
+                })
+        except Exception:
+            bomb_events_per_round = {}
 
     target_steam_id = normalize_id(steam_id)
     db_player_name = normalize_name(player_name)
     leetify_name = normalize_name(os.getenv("LEETIFY_NAME"))
 
-    deaths_df = parser.parse_event("player_death")
-    hurts_df = parser.parse_event("player_hurt")
-    rounds_df = parser.parse_event("round_end")
-    purchases_df = parse_event_with_fallback(parser, ["item_purchase", "item_buy"])
-
-    if deaths_df is None:
-        deaths_df = pd.DataFrame()
-    if hurts_df is None:
-        hurts_df = pd.DataFrame()
-    if rounds_df is None:
-        rounds_df = pd.DataFrame()
-    if purchases_df is None:
-        purchases_df = pd.DataFrame()
+    events = _EventCache(parser)
+    data = events.parsed
+    deaths_df = events.frame("kills", "player_death")
+    hurts_df = events.frame("damages", "player_hurt")
+    rounds_df = events.frame("rounds", "round_end")
+    purchases_df = events.first(["item_purchase", "item_buy"])
+    # These frames are probed by find_col dozens of times; build their column
+    # sets once.
+    deaths_columns = frozenset(deaths_df.columns)
+    hurts_columns = frozenset(hurts_df.columns)
+    rounds_columns = frozenset(rounds_df.columns)
+    purchases_columns = frozenset(purchases_df.columns)
 
     # ── Assign round numbers to flash blind events using round end ticks ──
     if player_blind_df is not None and not player_blind_df.empty and not rounds_df.empty:
         _re_tick_col = None
         for _c in ["tick", "tickNum", "tick_num", "time", "timeMs"]:
-            if _c in rounds_df.columns:
+            if _c in rounds_columns:
                 _re_tick_col = _c
                 break
         if _re_tick_col and "tick" in player_blind_df.columns:
@@ -923,18 +1507,8 @@ def parse_stats(
                     "duration": round(float(_brow.get("blind_duration", 0)), 1),
                 })
 
-    data = parser.parse() if hasattr(parser, "parse") else {}
     rounds = data.get("gameRounds", []) or []
-    header = None
-    if hasattr(parser, "parse_header"):
-        try:
-            header = parser.parse_header()
-        except Exception:
-            header = None
-    if header is None and hasattr(parser, "header"):
-        header = getattr(parser, "header")
-    if header is None and hasattr(parser, "demo_header"):
-        header = getattr(parser, "demo_header")
+    header = events.header
     debug_demo = os.getenv("DEBUG_DEMO") == "1"
 
     players_by_id: Dict[str, str] = {}
@@ -942,140 +1516,76 @@ def parse_stats(
     team_counts_by_id: Dict[str, Dict[str, int]] = {}
     last_team_by_id: Dict[str, str] = {}
 
-    def record_player(name: Optional[str], steamid: Optional[str]) -> None:
-        normalized_id = normalize_id(steamid)
-        normalized_name = normalize_name(name)
-        if normalized_id:
-            existing_name = players_by_id.get(normalized_id)
-            if not existing_name and normalized_name:
-                players_by_id[normalized_id] = normalized_name
-            elif normalized_id not in players_by_id:
-                players_by_id[normalized_id] = normalized_name or ""
-        if normalized_name and normalized_id:
-            name_key = normalize_name_key(normalized_name)
-            if name_key and name_key not in ids_by_name:
-                ids_by_name[name_key] = normalized_id
-
-    def record_player_team(steamid: Optional[str], team_value: Any) -> None:
-        normalized_id = normalize_id(steamid)
-        team_side = normalize_side(team_value)
-        if not normalized_id or not team_side:
-            return
-        team_counts_by_id.setdefault(normalized_id, {"CT": 0, "T": 0})
-        team_counts_by_id[normalized_id][team_side] += 1
-        last_team_by_id[normalized_id] = team_side
+    # Flatten every (steamid, name, team) sighting from the parsed players and
+    # round kill lists, then aggregate them in one pass instead of updating the
+    # lookup dicts entry by entry.
+    player_records: List[Tuple[Any, Any, Any]] = []
 
     if isinstance(data.get("players"), list):
-        for player in data.get("players", []) or []:
-            if isinstance(player, dict):
-                record_player_team(
-                    player.get("steamID")
-                    or player.get("steamId")
-                    or player.get("steamid"),
-                    player.get("team")
-                    or player.get("teamNum")
-                    or player.get("teamnum")
-                    or player.get("team_side")
-                    or player.get("teamSide")
-                    or player.get("side"),
-                )
-                record_player(
-                    player.get("name")
-                    or player.get("playerName")
-                    or player.get("username"),
-                    player.get("steamID")
-                    or player.get("steamId")
-                    or player.get("steamid"),
-                )
+        add_player_records(player_records, data.get("players", []) or [])
 
     for round_data in rounds:
         players_list = round_data.get("players") if isinstance(round_data, dict) else None
-        if isinstance(players_list, list):
-            for player in players_list:
-                if isinstance(player, dict):
-                    record_player_team(
-                        player.get("steamID")
-                        or player.get("steamId")
-                        or player.get("steamid"),
-                        player.get("team")
-                        or player.get("teamNum")
-                        or player.get("teamnum")
-                        or player.get("team_side")
-                        or player.get("teamSide")
-                        or player.get("side"),
-                    )
-                    record_player(
-                        player.get("name")
-                        or player.get("playerName")
-                        or player.get("username"),
-                        player.get("steamID")
-                        or player.get("steamId")
-                        or player.get("steamid"),
-                    )
-        elif isinstance(players_list, dict):
-            for player in players_list.values():
-                if isinstance(player, dict):
-                    record_player_team(
-                        player.get("steamID")
-                        or player.get("steamId")
-                        or player.get("steamid"),
-                        player.get("team")
-                        or player.get("teamNum")
-                        or player.get("teamnum")
-                        or player.get("team_side")
-                        or player.get("teamSide")
-                        or player.get("side"),
-                    )
-                    record_player(
-                        player.get("name")
-                        or player.get("playerName")
-                        or player.get("username"),
-                        player.get("steamID")
-                        or player.get("steamId")
-                        or player.get("steamid"),
-                    )
+        if isinstance(players_list, (list, dict)):
+            add_player_records(player_records, players_list)
 
         kills_list = round_data.get("kills", []) if isinstance(round_data, dict) else []
         for kill in kills_list or []:
             if isinstance(kill, dict):
-                record_player(
-                    extract_player_name(kill, "attacker"),
-                    extract_player_id(kill, "attacker"),
+                player_records.append(
+                    (
+                        extract_player_id(kill, "attacker"),
+                        extract_player_name(kill, "attacker"),
+                        None,
+                    )
                 )
-                record_player(
-                    extract_player_name(kill, "victim"),
-                    extract_player_id(kill, "victim"),
+                player_records.append(
+                    (
+                        extract_player_id(kill, "victim"),
+                        extract_player_name(kill, "victim"),
+                        None,
+                    )
                 )
 
-    def collect_from_events(df: pd.DataFrame) -> None:
-        if df.empty:
-            return
-        for col in df.columns:
-            col_lower = col.lower()
-            if "steamid" not in col_lower:
-                continue
-            if "steamid" in col:
-                prefix = col.rsplit("steamid", 1)[0]
-            else:
-                prefix = col.rsplit("SteamID", 1)[0]
-            name_candidates = [
-                f"{prefix}name",
-                f"{prefix}Name",
-                f"{prefix}_name",
-                f"{prefix}_playername",
-                f"{prefix}PlayerName",
-            ]
-            name_col = next((c for c in name_candidates if c in df.columns), None)
-            if name_col:
-                for steam_id_value, name_value in zip(df[col], df[name_col]):
-                    record_player(name_value, steam_id_value)
-            else:
-                for steam_id_value in df[col]:
-                    record_player(None, steam_id_value)
+    if player_records:
+        # dtype=object keeps raw IDs/team numbers from being coerced to float
+        # when some entries are missing.
+        records_df = pd.DataFrame(
+            player_records, columns=["steamid", "name", "team"], dtype=object
+        )
+        records_df["steamid"] = records_df["steamid"].map(normalize_id)
+        records_df["name"] = records_df["name"].map(normalize_name)
+        records_df["team"] = records_df["team"].map(normalize_side)
+        records_df = records_df.dropna(subset=["steamid"])
+
+        teams = records_df.dropna(subset=["team"])
+        if not teams.empty:
+            team_counts = (
+                teams.groupby("steamid")["team"]
+                .value_counts()
+                .unstack(fill_value=0)
+                .reindex(columns=["CT", "T"], fill_value=0)
+                .astype(int)
+            )
+            team_counts_by_id.update(team_counts.to_dict("index"))
+            last_team_by_id.update(teams.groupby("steamid")["team"].last().to_dict())
+
+        named = records_df.dropna(subset=["name"])
+        players_by_id.update(dict.fromkeys(records_df["steamid"], ""))
+        players_by_id.update(
+            named.drop_duplicates("steamid").set_index("steamid")["name"].to_dict()
+        )
+        name_keys = named.assign(name_key=named["name"].map(normalize_name_key))
+        ids_by_name.update(
+            name_keys.dropna(subset=["name_key"])
+            .drop_duplicates("name_key")
+            .set_index("name_key")["steamid"]
+            .to_dict()
+        )
 
     if not players_by_id:
-        collect_from_events(deaths_df)
-        collect_from_events(hurts_df)
+        collect_from_events(deaths_df, players_by_id, ids_by_name)
+        collect_from_events(hurts_df, players_by_id, ids_by_name)
 
     if players_by_id:
         for steamid, name in sorted(
@@ -1114,7 +1624,7 @@ def parse_stats(
         print(f"Using target SteamID: {target_steam_id}")
 
     attacker_col = find_col(
-        deaths_df,
+        deaths_columns,
         [
             "attacker_steamid",
             "attackerSteamID",
@@ -1123,7 +1633,7 @@ def parse_stats(
         ],
     )
     victim_col = find_col(
-        deaths_df,
+        deaths_columns,
         [
             "user_steamid",
             "userid_steamid",
@@ -1133,27 +1643,38 @@ def parse_stats(
         ],
     )
     headshot_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["headshot", "is_headshot", "isHeadshot", "headshot_bool"],
     )
+    # Normalized once here and reused by every per-player pass below.
+    attacker_ids = (
+        _normalized_ids(deaths_df[attacker_col])
+        if attacker_col and not deaths_df.empty
+        else None
+    )
+    victim_ids = (
+        _normalized_ids(deaths_df[victim_col])
+        if victim_col and not deaths_df.empty
+        else None
+    )
     round_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["round", "round_num", "round_number", "roundNum"],
     )
     time_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"],
     )
     dmg_round_col = find_col(
-        hurts_df,
+        hurts_columns,
         ["round", "round_num", "round_number", "roundNum"],
     )
     rounds_end_tick_col = find_col(
-        rounds_df,
+        rounds_columns,
         ["tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"],
     )
     rounds_num_col = find_col(
-        rounds_df,
+        rounds_columns,
         ["round", "round_num", "round_number", "roundNum"],
     )
     deaths_with_round, round_key = attach_round_numbers(
@@ -1165,11 +1686,11 @@ def parse_stats(
         rounds_end_tick_col,
     )
     purchases_time_col = find_col(
-        purchases_df,
+        purchases_columns,
         ["tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"],
     )
     purchases_round_col = find_col(
-        purchases_df,
+        purchases_columns,
         ["round", "round_num", "round_number", "roundNum"],
     )
     purchases_with_round, purchases_round_key = attach_round_numbers(
@@ -1181,11 +1702,11 @@ def parse_stats(
         rounds_end_tick_col,
     )
     weapon_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["weapon", "weapon_name", "weaponName", "weapon_type"],
     )
     trade_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["trade", "is_trade", "isTrade", "traded"],
     )
 
@@ -1199,45 +1720,42 @@ def parse_stats(
     t_kills = 0
     t_deaths = 0
     weapon_counts: Dict[str, int] = {}
-    if attacker_col and not deaths_df.empty:
-        kills = int(
-            (deaths_df[attacker_col].astype(str).str.strip() == target_steam_id).sum()
-        )
-    if victim_col and not deaths_df.empty:
-        deaths = int(
-            (deaths_df[victim_col].astype(str).str.strip() == target_steam_id).sum()
-        )
-    if attacker_col and headshot_col and not deaths_df.empty:
-        headshots = int(
-            (
-                (deaths_df[attacker_col].astype(str).str.strip() == target_steam_id)
-                & deaths_df[headshot_col].astype(bool)
-            ).sum()
-        )
+    # Cast once; the per-player headshot counts reuse it.
+    headshot_flags: Optional[np.ndarray] = None
+    if attacker_ids is not None:
+        attacker_mask = _id_mask(attacker_ids, target_steam_id)
+        kills = int(attacker_mask.sum())
+        if headshot_col:
+            headshot_flags = deaths_df[headshot_col].astype(bool).to_numpy()
+            headshots = int((attacker_mask & headshot_flags).sum())
+    if victim_ids is not None:
+        victim_mask = _id_mask(victim_ids, target_steam_id)
+        deaths = int(victim_mask.sum())
 
     dmg_attacker_col = find_col(
-        hurts_df,
+        hurts_columns,
         ["attacker_steamid", "attackerSteamID", "attacker_steam_id", "attacker"],
     )
     dmg_value_col = find_col(
-        hurts_df,
+        hurts_columns,
         ["dmg_health", "dmg_health_real", "health_damage", "hpDamage", "dmg"],
     )
     hurt_weapon_col = find_col(
-        hurts_df,
+        hurts_columns,
         ["weapon", "weapon_name", "weaponName", "weapon_type", "attacker_weapon"],
     )
+    hurt_attacker_ids = (
+        _normalized_ids(hurts_df[dmg_attacker_col])
+        if dmg_attacker_col and not hurts_df.empty
+        else None
+    )
     damage_total = 0.0
-    if dmg_attacker_col and dmg_value_col and not hurts_df.empty:
-        damage_total = float(
-            hurts_df.loc[
-                hurts_df[dmg_attacker_col].astype(str).str.strip() == target_steam_id,
-                dmg_value_col,
-            ]
-            .fillna(0)
-            .astype(float)
-            .sum()
+    if dmg_value_col and hurt_attacker_ids is not None:
+        damage_values = pd.to_numeric(hurts_df[dmg_value_col], errors="coerce").to_numpy(
+            dtype="float64"
         )
+        damage_mask = _id_mask(hurt_attacker_ids, target_steam_id)
+        damage_total = float(np.nansum(damage_values[damage_mask]))
 
     round_count = int(len(rounds_df)) if not rounds_df.empty else 0
     if round_count == 0 and round_key and not deaths_with_round.empty:
@@ -1268,52 +1786,71 @@ def parse_stats(
                 victim_rows[round_key], errors="coerce"
             ).dropna()
             if not round_numbers.empty:
+                # value_counts() is already sorted by count, so the mode is
+                # its first label.
                 round_counts = round_numbers.value_counts()
-                common_death_round = int(round_counts.idxmax())
+                common_death_round = int(round_counts.index[0])
                 first_death_round = int(round_numbers.min())
                 top_death_rounds = [int(value) for value in round_counts.head(3).index]
         if weapon_col and not victim_rows.empty:
             weapon_series = victim_rows[weapon_col].dropna().astype(str)
             if not weapon_series.empty:
-                common_death_weapon = str(weapon_series.value_counts().idxmax())
+                # factorize() numbers weapons in order of first appearance, so
+                # argmax breaks ties the same way value_counts().idxmax() did.
+                weapon_codes, weapon_names = pd.factorize(weapon_series)
+                common_death_weapon = str(weapon_names[np.bincount(weapon_codes).argmax()])
         if headshot_col and deaths:
             death_hs_percent = (
                 victim_rows[headshot_col].astype(bool).sum() / deaths * 100
             )
         if time_col and rounds_end_tick_col and not rounds_df.empty and not victim_rows.empty:
-            rounds_ticks = rounds_df[[rounds_end_tick_col]].copy()
-            rounds_ticks[rounds_end_tick_col] = pd.to_numeric(
-                rounds_ticks[rounds_end_tick_col], errors="coerce"
-            )
-            rounds_ticks = rounds_ticks.dropna(subset=[rounds_end_tick_col]).sort_values(
-                rounds_end_tick_col
+            round_ends = np.sort(
+                pd.to_numeric(rounds_df[rounds_end_tick_col], errors="coerce")
+                .dropna()
+                .to_numpy(dtype="float64")
             )
-            rounds_ticks = rounds_ticks.reset_index(drop=True)
-            round_starts = [0] + rounds_ticks[rounds_end_tick_col].tolist()[:-1]
+            # Round N starts where round N-1 ended (round 1 starts at tick 0).
+            round_starts = np.concatenate(([0.0], round_ends[:-1]))
             if round_key and round_key in victim_rows.columns:
-                victim_rows_local = victim_rows.copy()
-                victim_rows_local[time_col] = pd.to_numeric(
-                    victim_rows_local[time_col], errors="coerce"
+                death_ticks = pd.to_numeric(
+                    victim_rows[time_col], errors="coerce"
+                ).to_numpy(dtype="float64")
+                round_index = np.trunc(
+                    pd.to_numeric(victim_rows[round_key], errors="coerce").to_numpy(
+                        dtype="float64"
+                    )
+                )
+                valid = (
+                    ~np.isnan(death_ticks)
+                    & (round_index >= 1)
+                    & (round_index <= len(round_starts))
                 )
-                victim_rows_local = victim_rows_local.dropna(subset=[time_col])
-                if not victim_rows_local.empty:
-                    ticks = []
-                    for _, row in victim_rows_local.iterrows():
-                        round_index = int(row.get(round_key)) if row.get(round_key) else None
-                        if round_index and 1 <= round_index <= len(round_starts):
-                            start_tick = round_starts[round_index - 1]
-                            ticks.append(float(row[time_col]) - float(start_tick))
-                    if ticks:
-                        avg_death_time_sec = round(sum(ticks) / len(ticks) / 128, 1)
-                        median_death_time_sec = round(
-                            float(pd.Series(ticks).median()) / 128, 1
-                        )
+                if valid.any():
+                    ticks = (
+                        death_ticks[valid]
+                        - round_starts[round_index[valid].astype(np.int64) - 1]
+                    )
+                    avg_death_time_sec = round(float(ticks.mean()) / 128, 1)
+                    median_death_time_sec = round(float(np.median(ticks)) / 128, 1)
         if "distance" in victim_rows.columns and not victim_rows.empty:
             distances = pd.to_numeric(victim_rows["distance"], errors="coerce").dropna()
             if not distances.empty:
                 avg_death_distance = round(float(distances.mean()), 1)
 
+    # Determine MR from player count (MR12 competitive, MR8 wingman)
+    _quick_ids: set = set()
+    if attacker_ids is not None:
+        _quick_ids |= _observed_ids(attacker_ids, deaths_df[attacker_col])
+    if victim_ids is not None:
+        _quick_ids |= _observed_ids(victim_ids, deaths_df[victim_col])
+    _quick_ids.discard("")
+    mr = 8 if len(_quick_ids) == 4 else 12
+
     # ── Per-round analysis: kills, multi-kills, clutches ──
+    # One pass over the round kill lists feeds both the target's stats and
+    # every player's side tallies (side_by_id / first_half_side_by_id).
+    side_by_id: Dict[str, Dict[str, int]] = {}
+    first_half_side_by_id: Dict[str, str] = {}  # player_id → starting side (from first-half kills)
     multi_kill_rounds: List[Dict[str, Any]] = []
     clutch_rounds: List[Dict[str, Any]] = []
     user_round_kills: Dict[int, int] = {}  # round_num → kills by user
@@ -1325,11 +1862,25 @@ def parse_stats(
 
     for rnd_idx, round_data in enumerate(rounds):
         round_num = rnd_idx + 1
+        is_first_half = rnd_idx < mr
         kills_list = round_data.get("kills", []) or []
-        if kills_list:
-            opening_kill = min(kills_list, key=extract_time_value)
-            opening_attacker = normalize_id(opening_kill.get("attackerSteamID"))
-            opening_victim = normalize_id(opening_kill.get("victimSteamID"))
+        # Normalize each kill's ids and sides once; the opening-kill check,
+        # the main loop and both clutch scans below reuse these tuples.
+        kill_rows = [
+            (
+                kill,
+                normalize_id(kill.get("attackerSteamID")),
+                normalize_id(kill.get("victimSteamID")),
+                extract_side(kill, "attacker"),
+                extract_side(kill, "victim"),
+            )
+            for kill in kills_list
+        ]
+        # Sort once per round; the opening kill and the clutch scan both use
+        # this order (sorted() is stable, so ties keep min()'s first pick).
+        sorted_rows = sorted(kill_rows, key=lambda row: extract_time_value(row[0]))
+        if sorted_rows:
+            _, opening_attacker, opening_victim, _, _ = sorted_rows[0]
             if opening_attacker and opening_attacker == target_steam_id:
                 opening_kills += 1
             if opening_victim and opening_victim == target_steam_id:
@@ -1337,9 +1888,15 @@ def parse_stats(
 
         user_kills_this_round = 0
         user_died_this_round = False
-        for kill in kills_list:
-            attacker = normalize_id(kill.get("attackerSteamID"))
-            victim = normalize_id(kill.get("victimSteamID"))
+        for kill, attacker, victim, attacker_side, victim_side in kill_rows:
+            if attacker and attacker_side:
+                side_by_id.setdefault(attacker, {"CT": 0, "T": 0})[attacker_side] += 1
+                if is_first_half and attacker not in first_half_side_by_id:
+                    first_half_side_by_id[attacker] = attacker_side
+            if victim and victim_side:
+                side_by_id.setdefault(victim, {"CT": 0, "T": 0})[victim_side] += 1
+                if is_first_half and victim not in first_half_side_by_id:
+                    first_half_side_by_id[victim] = victim_side
             weapon = kill.get("weapon") or kill.get("weaponName") or kill.get("weapon_name")
             is_hs = bool(kill.get("headshot") or kill.get("isHeadshot") or kill.get("headshot_bool"))
             if attacker and attacker == target_steam_id and weapon:
@@ -1347,14 +1904,13 @@ def parse_stats(
                 weapon_counts[weapon_key] = weapon_counts.get(weapon_key, 0) + 1
             if attacker and attacker == target_steam_id:
                 user_kills_this_round += 1
-                attacker_side = extract_side(kill, "attacker")
                 if attacker_side == "CT":
                     ct_kills += 1
                 elif attacker_side == "T":
                     t_kills += 1
                 # Store kill details with positional context from rich parser
-                victim_name = extract_player_name(kill, "victim") or players_by_id.get(normalize_id(kill.get("victimSteamID")), "unknown")
-                v_id_str = normalize_id(kill.get("victimSteamID")) or ""
+                victim_name = extract_player_name(kill, "victim") or players_by_id.get(victim, "unknown")
+                v_id_str = victim or ""
                 ctx = kill_context.get((round_num, v_id_str), {})
                 kill_detail: Dict[str, Any] = {
                     "victim": victim_name,
@@ -1374,13 +1930,12 @@ def parse_stats(
                 user_kill_details.setdefault(round_num, []).append(kill_detail)
             if victim and victim == target_steam_id:
                 user_died_this_round = True
-                victim_side = extract_side(kill, "victim")
                 if victim_side == "CT":
                     ct_deaths += 1
                 elif victim_side == "T":
                     t_deaths += 1
                 # Store death details with positional context from rich parser
-                attacker_name = extract_player_name(kill, "attacker") or players_by_id.get(normalize_id(kill.get("attackerSteamID")), "unknown")
+                attacker_name = extract_player_name(kill, "attacker") or players_by_id.get(attacker, "unknown")
                 ctx = kill_context.get((round_num, target_steam_id), {})
                 death_detail: Dict[str, Any] = {
                     "weapon": str(weapon) if weapon else "unknown",
@@ -1415,18 +1970,15 @@ def parse_stats(
 
         # ── Clutch detection ──
         # A clutch = user is last alive on their team facing 2+ enemies, then gets kills
-        if kills_list and len(kills_list) >= 2:
-            sorted_kills = sorted(kills_list, key=extract_time_value)
+        if len(sorted_rows) >= 2:
             # Determine user's CURRENT side this round
             user_current_side = None
-            for k in sorted_kills:
-                kid = normalize_id(k.get("attackerSteamID"))
-                vid = normalize_id(k.get("victimSteamID"))
+            for _, kid, vid, k_attacker_side, k_victim_side in sorted_rows:
                 if kid == target_steam_id:
-                    user_current_side = extract_side(k, "attacker")
+                    user_current_side = k_attacker_side
                     break
                 if vid == target_steam_id:
-                    user_current_side = extract_side(k, "victim")
+                    user_current_side = k_victim_side
                     break
             if user_current_side:
                 t_size = team_size if team_size else 5
@@ -1436,10 +1988,7 @@ def parse_stats(
                 clutch_triggered = False
                 clutch_enemies = 0
                 clutch_kills = 0
-                for k in sorted_kills:
-                    v_side = extract_side(k, "victim")
-                    v_id = normalize_id(k.get("victimSteamID"))
-                    a_id = normalize_id(k.get("attackerSteamID"))
+                for _, a_id, v_id, _, v_side in sorted_rows:
                     if v_side == user_current_side:
                         if v_id == target_steam_id:
                             user_still_alive = False
@@ -1462,30 +2011,39 @@ def parse_stats(
                         "survived": True,
                     })
 
-    if not rounds and time_col and attacker_col and victim_col and not deaths_with_round.empty and round_key:
-        deaths_df_local = deaths_with_round.copy()
-        deaths_df_local[time_col] = pd.to_numeric(deaths_df_local[time_col], errors="coerce")
-        deaths_df_local = deaths_df_local.dropna(subset=[time_col])
+    # First kill of every round, shared by the fallback below and
+    # opening_kills_by_id so the deaths frame is sorted and grouped once.
+    deaths_timed = deaths_with_round
+    first_kills_all: Optional[pd.DataFrame] = None
+    if round_key and time_col and attacker_col and victim_col and not deaths_with_round.empty:
+        deaths_timed = deaths_with_round.assign(
+            **{time_col: pd.to_numeric(deaths_with_round[time_col], errors="coerce")}
+        ).dropna(subset=[time_col])
+        first_kills_all = deaths_timed.sort_values(time_col).groupby(round_key).first()
+
+    if not rounds and first_kills_all is not None:
+        deaths_df_local = deaths_timed
         if not deaths_df_local.empty:
-            first_kills = deaths_df_local.sort_values(time_col).groupby(round_key).first()
+            first_kills = first_kills_all
             opening_kills = int(
                 (first_kills[attacker_col].astype(str).str.strip() == target_steam_id).sum()
             )
             opening_deaths = int(
                 (first_kills[victim_col].astype(str).str.strip() == target_steam_id).sum()
             )
-            print(
-                "DEBUG: opening duels from deaths_df: "
-                f"rounds={len(first_kills)}, opening_kills={opening_kills}, "
-                f"opening_deaths={opening_deaths}"
-            )
-            sample_rows = first_kills[[attacker_col, victim_col]].head(5)
-            print("DEBUG: first_kills sample:")
-            print(sample_rows.to_string(index=True))
+            if debug_demo:
+                print(
+                    "DEBUG: opening duels from deaths_df: "
+                    f"rounds={len(first_kills)}, opening_kills={opening_kills}, "
+                    f"opening_deaths={opening_deaths}"
+                )
+                sample_rows = first_kills[[attacker_col, victim_col]].head(5)
+                print("DEBUG: first_kills sample:")
+                print(sample_rows.to_string(index=True))
 
             # Build per-round death/kill details from deaths_df (fallback when rounds list is empty)
-            attacker_name_col = find_col(deaths_df, ["attacker_name", "attackerName", "attacker_player_name"])
-            victim_name_col = find_col(deaths_df, ["user_name", "victim_name", "victimName", "userid_name"])
+            attacker_name_col = find_col(deaths_columns, ["attacker_name", "attackerName", "attacker_player_name"])
+            victim_name_col = find_col(deaths_columns, ["user_name", "victim_name", "victimName", "userid_name"])
             # Team columns for side stats (demoparser2 uses numeric team values: 2=T, 3=CT)
             _a_team_col = find_col(deaths_df_local, [
                 "attacker_team_num", "attackerTeam", "attacker_team",
@@ -1749,10 +2307,12 @@ def parse_stats(
                     _target_side = str(_trow.get("victim_side", "")).strip()
                     break
             if _target_side:
-                for _rn_val in _tk_df["round_num"].unique():
-                    _rk_sorted = _tk_df[_tk_df["round_num"] == _rn_val].sort_values("tick")
+                # One groupby pass instead of re-filtering the frame per round;
+                # each kill only needs the kill just before it in its round.
+                for _rn_val, _rk in _tk_df.groupby("round_num", sort=False):
+                    _rk_sorted = _rk.sort_values("tick")
                     _prev = None
-                    for _, _k in _rk_sorted.iterrows():
+                    for _k in _rk_sorted.to_dict("records"):
                         if _prev is not None:
                             # Player trade-killed: teammate died, then player killed the enemy within window
                             if (str(_prev.get("victim_side", "")) == _target_side
@@ -1801,19 +2361,11 @@ def parse_stats(
         max_tick = pd.to_numeric(rounds_df[rounds_end_tick_col], errors="coerce").dropna()
         if not max_tick.empty:
             match_meta["duration"] = float(max_tick.max()) / 128
-    # Determine MR from player count (MR12 competitive, MR8 wingman)
-    _quick_ids: set = set()
-    if attacker_col and not deaths_df.empty:
-        _quick_ids.update(deaths_df[attacker_col].dropna().astype(str).str.strip().tolist())
-    if victim_col and not deaths_df.empty:
-        _quick_ids.update(deaths_df[victim_col].dropna().astype(str).str.strip().tolist())
-    _quick_ids.discard("")
-    mr = 8 if len(_quick_ids) == 4 else 12
 
     score_ct = None
     score_t = None
     winner = None
-    winner_col = find_col(rounds_df, ["winner", "winnerSide", "winnerTeam", "winner_team"])
+    winner_col = find_col(rounds_columns, ["winner", "winnerSide", "winnerTeam", "winner_team"])
     if winner_col and not rounds_df.empty:
         winner_series = rounds_df[winner_col].map(normalize_side)
 
@@ -1847,63 +2399,75 @@ def parse_stats(
     rounds_history: List[Dict[str, Any]] = []
     if not rounds_df.empty:
         round_end_tick_col = find_col(
-            rounds_df,
+            rounds_columns,
             ["tick", "tickNum", "tick_num", "tickNumber", "time", "timeMs"],
         )
         winner_col = find_col(
-            rounds_df,
+            rounds_columns,
             ["winner", "winnerSide", "winnerTeam", "winner_team", "winningSide"],
         )
         reason_col = find_col(
-            rounds_df,
+            rounds_columns,
             ["reason", "end_reason", "roundEndReason", "win_reason", "round_end_reason"],
         )
         total_rounds_col = find_col(
-            rounds_df,
+            rounds_columns,
             ["total_rounds_played", "totalRoundsPlayed", "round", "round_num", "round_number", "roundNum", "roundNumber"],
         )
-        rounds_local = rounds_df.copy()
+        # Only the columns read below; the full round_end frame is never copied.
+        rounds_local = rounds_df[
+            list(dict.fromkeys(
+                col
+                for col in (round_end_tick_col, winner_col, reason_col, total_rounds_col)
+                if col
+            ))
+        ]
         if round_end_tick_col:
-            rounds_local[round_end_tick_col] = pd.to_numeric(
-                rounds_local[round_end_tick_col], errors="coerce"
-            )
-            rounds_local = rounds_local.dropna(subset=[round_end_tick_col])
+            rounds_local = rounds_local.assign(
+                **{round_end_tick_col: pd.to_numeric(rounds_df[round_end_tick_col], errors="coerce")}
+            ).dropna(subset=[round_end_tick_col])
             rounds_local = rounds_local.sort_values(round_end_tick_col)
         rounds_local = rounds_local.reset_index(drop=True)
 
-        ct_running = 0  # running score of team that STARTED CT
-        t_running = 0   # running score of team that STARTED T
-        for index, row in rounds_local.iterrows():
-            round_number = parse_int(row.get(total_rounds_col)) if total_rounds_col else None
-            if round_number is None:
-                round_number = index + 1
-            winner_side = normalize_side(row.get(winner_col)) if winner_col else None
-            reason = normalize_reason(row.get(reason_col)) if reason_col else None
-
-            # Use team-based scoring (accounting for halftime side swap)
-            if winner_side in ("CT", "T"):
-                ct_team_plays_as = starting_ct_plays_as(round_number, mr)
-                if winner_side == ct_team_plays_as:
-                    ct_running += 1
-                else:
-                    t_running += 1
-
-            rounds_history.append(
-                {
-                    "round_number": round_number,
-                    "winner_side": winner_side,
-                    "reason": reason,
-                    "ct_score": ct_running,
-                    "t_score": t_running,
-                }
+        def column_values(col: Optional[str], convert) -> List[Any]:
+            if not col:
+                return [None] * len(rounds_local)
+            return [convert(value) for value in rounds_local[col].tolist()]
+
+        round_numbers = [
+            index + 1 if number is None else number
+            for index, number in enumerate(column_values(total_rounds_col, parse_int))
+        ]
+        winner_sides = column_values(winner_col, normalize_side)
+        reasons = column_values(reason_col, normalize_reason)
+
+        # Team-based scoring (accounting for halftime side swap): cumulative
+        # round wins of the teams that STARTED CT and T.
+        winners = np.array(winner_sides, dtype=object)
+        ct_team_plays_as = np.array(
+            [starting_ct_plays_as(number, mr) for number in round_numbers], dtype=object
+        )
+        decided = (winners == "CT") | (winners == "T")
+        ct_team_won = decided & (winners == ct_team_plays_as)
+        ct_scores = np.cumsum(ct_team_won).tolist()
+        t_scores = np.cumsum(decided & ~ct_team_won).tolist()
+        rounds_history = [
+            {
+                "round_number": round_number,
+                "winner_side": winner_side,
+                "reason": reason,
+                "ct_score": ct_score,
+                "t_score": t_score,
+            }
+            for round_number, winner_side, reason, ct_score, t_score in zip(
+                round_numbers, winner_sides, reasons, ct_scores, t_scores
             )
+        ]
 
     opening_kills_by_id: Dict[str, int] = {}
     opening_deaths_by_id: Dict[str, int] = {}
-    side_by_id: Dict[str, Dict[str, int]] = {}
     trade_kills_by_id: Dict[str, int] = {}
-    if round_key and time_col and not deaths_with_round.empty and attacker_col and victim_col:
-        first_kills_all = deaths_with_round.sort_values(time_col).groupby(round_key).first()
+    if first_kills_all is not None:
         for _, row in first_kills_all.iterrows():
             attacker_id = normalize_id(row.get(attacker_col))
             victim_id = normalize_id(row.get(victim_col))
@@ -1912,73 +2476,31 @@ def parse_stats(
             if victim_id:
                 opening_deaths_by_id[victim_id] = opening_deaths_by_id.get(victim_id, 0) + 1
 
-    first_half_side_by_id: Dict[str, str] = {}  # player_id → starting side (from first-half kills)
-    for rnd_idx, round_data in enumerate(rounds):
-        is_first_half = rnd_idx < mr
-        kills_list = round_data.get("kills", []) if isinstance(round_data, dict) else []
-        for kill in kills_list or []:
-            if not isinstance(kill, dict):
-                continue
-            attacker_id = normalize_id(kill.get("attackerSteamID"))
-            victim_id = normalize_id(kill.get("victimSteamID"))
-            attacker_side = extract_side(kill, "attacker")
-            victim_side = extract_side(kill, "victim")
-            if attacker_id and attacker_side:
-                side_by_id.setdefault(attacker_id, {"CT": 0, "T": 0})
-                side_by_id[attacker_id][attacker_side] += 1
-                if is_first_half and attacker_id not in first_half_side_by_id:
-                    first_half_side_by_id[attacker_id] = attacker_side
-            if victim_id and victim_side:
-                side_by_id.setdefault(victim_id, {"CT": 0, "T": 0})
-                side_by_id[victim_id][victim_side] += 1
-                if is_first_half and victim_id not in first_half_side_by_id:
-                    first_half_side_by_id[victim_id] = victim_side
-
-    team_graph: Dict[str, List[str]] = {}
-    if attacker_col and victim_col and not deaths_df.empty:
-        for attacker_id, victim_id in zip(
-            deaths_df[attacker_col].astype(str).str.strip(),
-            deaths_df[victim_col].astype(str).str.strip(),
-        ):
-            if not attacker_id or not victim_id:
-                continue
-            team_graph.setdefault(attacker_id, []).append(victim_id)
-            team_graph.setdefault(victim_id, []).append(attacker_id)
-
-    team_map: Dict[str, int] = {}
-    for node in team_graph:
-        if node in team_map:
-            continue
-        team_map[node] = 0
-        stack = [node]
-        while stack:
-            current = stack.pop()
-            for neighbor in team_graph.get(current, []):
-                if neighbor not in team_map:
-                    team_map[neighbor] = 1 - team_map[current]
-                    stack.append(neighbor)
-
-    def resolve_team_side(player_id: str) -> Optional[str]:
-        last_team = last_team_by_id.get(player_id)
+    # Each player's last-recorded side, resolved once. Sources are applied
+    # from weakest to strongest so a stronger one overwrites: the majority
+    # side from kill events, then from tick data, then the last team seen in
+    # tick data. Tied tallies are skipped.
+    team_side_by_id: Dict[str, str] = {}
+    for side_counts in (side_by_id, team_counts_by_id):
+        for player_id, counts in side_counts.items():
+            ct_count = counts.get("CT", 0)
+            t_count = counts.get("T", 0)
+            if ct_count != t_count:
+                team_side_by_id[player_id] = "CT" if ct_count > t_count else "T"
+    for player_id, last_team in last_team_by_id.items():
         if last_team in {"CT", "T"}:
-            return last_team
-        if player_id in team_counts_by_id:
-            ct_count = team_counts_by_id[player_id].get("CT", 0)
-            t_count = team_counts_by_id[player_id].get("T", 0)
-            if ct_count > t_count:
-                return "CT"
-            if t_count > ct_count:
-                return "T"
-        if player_id in side_by_id:
-            ct_count = side_by_id[player_id].get("CT", 0)
-            t_count = side_by_id[player_id].get("T", 0)
-            if ct_count > t_count:
-                return "CT"
-            if t_count > ct_count:
-                return "T"
-        if player_id in team_map:
-            return "CT" if team_map[player_id] == 0 else "T"
-        return None
+            team_side_by_id[player_id] = last_team
+
+    # Last-resort team guess: killers and victims are on opposite teams.
+    # Only needed when some player in the deaths frame is still unresolved.
+    if attacker_ids is not None and victim_ids is not None:
+        players, (attacker_codes, victim_codes) = _shared_id_codes(attacker_ids, victim_ids)
+        if any(player not in team_side_by_id for player in players):
+            team_by_code = _bipartition(attacker_codes, victim_codes, len(players))
+            for code in np.flatnonzero(team_by_code >= 0):
+                team_side_by_id.setdefault(
+                    players[code], "CT" if team_by_code[code] == 0 else "T"
+                )
 
     def resolve_starting_side(player_id: str) -> Optional[str]:
         """Return the side the player STARTED the match on.
@@ -1992,51 +2514,47 @@ def parse_stats(
         if player_id in first_half_side_by_id:
             return first_half_side_by_id[player_id]
         # Fallback: invert last-recorded side if past halftime
-        current = resolve_team_side(player_id)
+        current = team_side_by_id.get(player_id)
         if not current:
             return None
         if round_count > mr:
             return "T" if current == "CT" else "CT"
         return current
 
-    if trade_col and attacker_col and not deaths_df.empty:
+    if trade_col and attacker_ids is not None:
         trade_flags = deaths_df[trade_col].astype(bool)
-        for attacker_id, is_trade in zip(
-            deaths_df[attacker_col].astype(str).str.strip(), trade_flags
-        ):
+        for attacker_id, is_trade in zip(attacker_ids, trade_flags):
             if attacker_id and is_trade:
                 trade_kills_by_id[attacker_id] = trade_kills_by_id.get(attacker_id, 0) + 1
-    elif time_col and attacker_col and victim_col and not deaths_df.empty:
-        kills_sorted = deaths_df.copy()
-        kills_sorted[time_col] = pd.to_numeric(kills_sorted[time_col], errors="coerce")
-        kills_sorted = kills_sorted.dropna(subset=[time_col]).sort_values(time_col)
-        window_ticks = 5 * 128
-        recent: List[Tuple[str, str, float]] = []
-        for _, row in kills_sorted.iterrows():
-            tick_value = float(row[time_col])
-            attacker_id = normalize_id(row.get(attacker_col))
-            victim_id = normalize_id(row.get(victim_col))
-            if not attacker_id or not victim_id:
-                continue
-            recent = [entry for entry in recent if tick_value - entry[2] <= window_ticks]
-            attacker_team = resolve_team_side(attacker_id)
-            if attacker_team:
-                for killer_id, killed_id, _ in recent:
-                    if killer_id == victim_id:
-                        killed_team = resolve_team_side(killed_id)
-                        if killed_team and killed_team == attacker_team:
-                            trade_kills_by_id[attacker_id] = trade_kills_by_id.get(attacker_id, 0) + 1
-                            break
-            recent.append((attacker_id, victim_id, tick_value))
-
-    player_ids = set()
-    if attacker_col and not deaths_df.empty:
-        player_ids.update(deaths_df[attacker_col].dropna().astype(str).str.strip().tolist())
-    if victim_col and not deaths_df.empty:
-        player_ids.update(deaths_df[victim_col].dropna().astype(str).str.strip().tolist())
-    if dmg_attacker_col and not hurts_df.empty:
-        player_ids.update(hurts_df[dmg_attacker_col].dropna().astype(str).str.strip().tolist())
-    player_ids = {pid for pid in player_ids if pid}
+    elif time_col and attacker_ids is not None and victim_ids is not None:
+        # A kill within 5s of the victim killing a teammate is a trade.
+        team_codes = np.array(
+            [{"CT": 0, "T": 1}.get(team_side_by_id.get(p), -1) for p in players],
+            dtype=np.int64,
+        )
+        kill_ticks = pd.to_numeric(deaths_df[time_col], errors="coerce").to_numpy(
+            dtype="float64"
+        )
+        keep = ~np.isnan(kill_ticks) & (attacker_codes >= 0) & (victim_codes >= 0)
+        order = np.argsort(kill_ticks[keep], kind="stable")
+        trade_counts = _count_trade_kills(
+            kill_ticks[keep][order],
+            attacker_codes[keep][order],
+            victim_codes[keep][order],
+            team_codes,
+            5 * 128,
+        )
+        for code in np.flatnonzero(trade_counts):
+            trade_kills_by_id[players[code]] = int(trade_counts[code])
+
+    player_ids: Set[str] = set()
+    if attacker_ids is not None:
+        player_ids |= _observed_ids(attacker_ids, deaths_df[attacker_col])
+    if victim_ids is not None:
+        player_ids |= _observed_ids(victim_ids, deaths_df[victim_col])
+    if hurt_attacker_ids is not None:
+        player_ids |= _observed_ids(hurt_attacker_ids, hurts_df[dmg_attacker_col])
+    player_ids.discard("")
 
     player_count = len(player_ids)
     team_size = player_count // 2 if player_count and player_count % 2 == 0 else None
@@ -2050,52 +2568,49 @@ def parse_stats(
         game_mode = "Unknown"
 
     assists_col = find_col(
-        deaths_df,
+        deaths_columns,
         ["assister_steamid", "assisterSteamID", "assister_steam_id", "assister"],
     )
 
     damage_by_id: Dict[str, float] = {}
     utility_damage_by_id: Dict[str, float] = {}
-    if dmg_attacker_col and dmg_value_col and not hurts_df.empty:
-        hurt_attackers = hurts_df[dmg_attacker_col].astype(str).str.strip()
+    if dmg_value_col and hurt_attacker_ids is not None:
+        # Sum per attacker on the cached id codes rather than per row.
         dmg_values = hurts_df[dmg_value_col].fillna(0).astype(float)
-        for attacker_id, dmg_value in zip(hurt_attackers, dmg_values):
-            if attacker_id:
-                damage_by_id[attacker_id] = damage_by_id.get(attacker_id, 0.0) + float(dmg_value)
+        damage_by_id = dmg_values.groupby(hurt_attacker_ids, observed=True).sum().to_dict()
+        damage_by_id.pop("", None)
         if hurt_weapon_col:
-            hurt_weapons = hurts_df[hurt_weapon_col].astype(str)
-            for attacker_id, dmg_value, weapon_value in zip(
-                hurt_attackers, dmg_values, hurt_weapons
-            ):
-                if attacker_id and is_utility_weapon(weapon_value):
-                    utility_damage_by_id[attacker_id] = utility_damage_by_id.get(attacker_id, 0.0) + float(dmg_value)
+            utility_mask = utility_weapon_mask(hurts_df[hurt_weapon_col])
+            utility_damage_by_id = (
+                dmg_values[utility_mask]
+                .groupby(hurt_attacker_ids[utility_mask], observed=True)
+                .sum()
+                .to_dict()
+            )
+            utility_damage_by_id.pop("", None)
+
+    # Count kills/deaths/assists/headshots for every player in one pass per
+    # column instead of rescanning the deaths frame for each player.
+    kills_by_id: Dict[str, int] = {}
+    headshots_by_id: Dict[str, int] = {}
+    deaths_by_id: Dict[str, int] = {}
+    assists_by_id: Dict[str, int] = {}
+    if attacker_ids is not None:
+        kills_by_id = attacker_ids.value_counts().to_dict()
+        if headshot_flags is not None:
+            headshots_by_id = attacker_ids[headshot_flags].value_counts().to_dict()
+    if victim_ids is not None:
+        deaths_by_id = victim_ids.value_counts().to_dict()
+    if assists_col and not deaths_df.empty:
+        assists_by_id = deaths_df[assists_col].astype(str).str.strip().value_counts().to_dict()
 
     player_stats: List[Dict[str, Any]] = []
     for player_id in sorted(player_ids):
-        kills_total = 0
-        deaths_total = 0
-        assists_total = 0
-        headshots_total = 0
         team_side = resolve_starting_side(player_id)
-        if attacker_col and not deaths_df.empty:
-            kills_total = int(
-                (deaths_df[attacker_col].astype(str).str.strip() == player_id).sum()
-            )
-            if headshot_col:
-                headshots_total = int(
-                    (
-                        (deaths_df[attacker_col].astype(str).str.strip() == player_id)
-                        & deaths_df[headshot_col].astype(bool)
-                    ).sum()
-                )
-        if victim_col and not deaths_df.empty:
-            deaths_total = int(
-                (deaths_df[victim_col].astype(str).str.strip() == player_id).sum()
-            )
-        if assists_col and not deaths_df.empty:
-            assists_total = int(
-                (deaths_df[assists_col].astype(str).str.strip() == player_id).sum()
-            )
+        kills_total = int(kills_by_id.get(player_id, 0))
+        deaths_total = int(deaths_by_id.get(player_id, 0))
+        assists_total = int(assists_by_id.get(player_id, 0))
+        headshots_total = int(headshots_by_id.get(player_id, 0))
 
         hs_ratio = (headshots_total / kills_total * 100) if kills_total else 0.0
         damage_total_player = damage_by_id.get(player_id, 0.0)
@@ -2129,56 +2644,25 @@ def parse_stats(
             ["team", "team_name", "teamNum", "teamnum", "team_side", "side"],
         )
         if item_col and team_col and purchases_round_key:
-            purchases_local = purchases_with_round.copy()
-            purchases_local["team_norm"] = purchases_local[team_col].map(normalize_side)
-            purchases_local = purchases_local.dropna(subset=["team_norm", purchases_round_key])
-            purchases_local["item_cat"] = purchases_local[item_col].astype(str).map(categorize_item)
+            purchases_local = purchases_with_round[[item_col, purchases_round_key]].assign(
+                team_norm=purchases_with_round[team_col].map(normalize_side)
+            ).dropna(subset=["team_norm", purchases_round_key])
+            purchases_local = purchases_local.assign(
+                item_cat=purchases_local[item_col].astype(str).map(categorize_item)
+            )
             buy_counts: Dict[str, Dict[str, int]] = {"CT": {}, "T": {}}
-            for (round_value, team_value), group in purchases_local.groupby(
-                [purchases_round_key, "team_norm"]
-            ):
-                if team_value not in {"CT", "T"}:
-                    continue
-                primary_count = int((group["item_cat"] == "primary").sum())
-                buy_type = None
-                if team_size:
-                    if primary_count >= team_size:
-                        buy_type = "full"
-                    elif primary_count == 0:
-                        buy_type = "eco"
-                    else:
-                        buy_type = "force"
-                if buy_type:
-                    buy_counts[team_value][buy_type] = buy_counts[team_value].get(buy_type, 0) + 1
+            if team_size:
+                buy_counts = count_buy_types(purchases_local, purchases_round_key, team_size)
             buy_summary = buy_counts
 
     # ── Determine user's STARTING side (first half) ──
-    # resolve_team_side returns the last-recorded side which is the second-half
+    # team_side_by_id holds the last-recorded side which is the second-half
     # side.  We need the starting side so it aligns with score_ct / score_t.
     user_starting_side: Optional[str] = None
     if target_steam_id:
-        # Strategy 1: Look at kill events in the first mr rounds
-        for rnd_idx, round_data in enumerate(rounds):
-            if rnd_idx >= mr:  # only first half
-                break
-            for kill in (round_data.get("kills", []) or []):
-                attacker_id = normalize_id(kill.get("attackerSteamID"))
-                victim_id = normalize_id(kill.get("victimSteamID"))
-                if attacker_id == target_steam_id:
-                    side = extract_side(kill, "attacker")
-                    if side in ("CT", "T"):
-                        user_starting_side = side
-                        break
-                if victim_id == target_steam_id:
-                    side = extract_side(kill, "victim")
-                    if side in ("CT", "T"):
-                        user_starting_side = side
-                        break
-            if user_starting_side:
-                break
-        # Strategy 2: Use resolve_starting_side (inverts second-half side when needed)
-        if not user_starting_side:
-            user_starting_side = resolve_starting_side(target_steam_id)
+        # First-half kill events give the side directly; resolve_starting_side
+        # checks those first and otherwise inverts the second-half side.
+        user_starting_side = resolve_starting_side(target_steam_id)
 
     # ── Cross-validate: team kill totals should match their round wins ──
     # If the team with MORE total kills has FEWER round wins, the side labels
@@ -2293,9 +2777,6 @@ def get_ai_coaching_tip(
     if not api_key:
         raise RuntimeError("GROQ_API_KEY must be set")
 
-    if _rate_limiter is not None:
-        _rate_limiter.acquire()
-
     client = Groq(api_key=api_key)
 
     # ── Extract all available data from parsed stats ──
@@ -2859,30 +3340,48 @@ def get_ai_coaching_tip(
         + ("\n\nEconomy Data:\n- " + "\n- ".join(facts_lines) if facts_lines else "")
     )
 
-    try:
-        completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert CS2 coach who gives DEEP tactical analysis, not generic advice. "
-                        "DO NOT give lazy tips like 'use flash before peeking' for every death. "
-                        "Instead, analyze patterns: Why did they die to the same player twice? Why were their deaths not traded? "
-                        "Look at economy rounds, positioning habits, accuracy trends, and teamplay issues. "
-                        "Give VARIED advice: positioning, trading, timing, economy, weapon choice, communication, angle use. "
-                        "Always reference SPECIFIC rounds and map locations from the data. "
-                        "Write like a friend coaching you — plain conversational language. "
-                        "NEVER use abbreviations (R11, HS, dmg, u.) — spell everything out. "
-                        "Keep response 2000-3000 characters. Every sentence must teach something."
-                    ),
-                },
-                {"role": "user", "content": prompt},
-            ],
-            model=MODEL_NAME,
-            max_tokens=2000,
-        )
-    except Exception as exc:
-        raise RuntimeError(f"Groq request failed: {exc}") from exc
+    for attempt in range(PARSE_AI_QUOTA_RETRIES + 1):
+        if _rate_limiter is not None:
+            _rate_limiter.acquire()
+        if _ai_limiter is not None:
+            _ai_limiter.acquire()
+        try:
+            completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "You are an expert CS2 coach who gives DEEP tactical analysis, not generic advice. "
+                            "DO NOT give lazy tips like 'use flash before peeking' for every death. "
+                            "Instead, analyze patterns: Why did they die to the same player twice? Why were their deaths not traded? "
+                            "Look at economy rounds, positioning habits, accuracy trends, and teamplay issues. "
+                            "Give VARIED advice: positioning, trading, timing, economy, weapon choice, communication, angle use. "
+                            "Always reference SPECIFIC rounds and map locations from the data. "
+                            "Write like a friend coaching you — plain conversational language. "
+                            "NEVER use abbreviations (R11, HS, dmg, u.) — spell everything out. "
+                            "Keep response 2000-3000 characters. Every sentence must teach something."
+                        ),
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                model=MODEL_NAME,
+                max_tokens=2000,
+            )
+        except Exception as exc:
+            throttled = is_quota_error(exc)
+            if _ai_limiter is not None:
+                _ai_limiter.release(
+                    throttled, parse_retry_after_seconds(exc), success=False
+                )
+            if throttled and attempt < PARSE_AI_QUOTA_RETRIES:
+                # Back off on this request only; acquire() waits out the
+                # retry-after before any AI request goes out again.
+                log(f"AI rate limit hit for match {match_id}; retrying ({exc})")
+                continue
+            raise RuntimeError(f"Groq request failed: {exc}") from exc
+        if _ai_limiter is not None:
+            _ai_limiter.release(False)
+        break
 
     response_text = completion.choices[0].message.content.strip()
 
@@ -2894,82 +3393,273 @@ def get_ai_coaching_tip(
     return response_text
 
 
+TipRow = Tuple[int, str, Optional[str], Optional[str]]
+
+
+def new_parse_pool() -> ProcessPoolExecutor:
+    """Create the process pool that runs ``parse_stats``.
+
+    Workers are (re)started while the daemon's threads and pooled DB sockets
+    are live, so on POSIX they come from a forkserver instead of a plain fork
+    that could inherit a held lock or a connection.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(
+        max_workers=PARSE_PROCESSES, mp_context=multiprocessing.get_context(method)
+    )
+
+
+def claim_batch(pool: ThreadedConnectionPool) -> List[Dict[str, Any]]:
+    """Claim the next daemon batch in its own short transaction.
+
+    The row locks are released before any parsing starts; the claims keep
+    other parsers off the matches until they are finished or expire.
+    """
+    with checkout(pool) as db_conn, db_conn, db_conn.cursor(
+        cursor_factory=RealDictCursor
+    ) as cursor:
+        return fetch_matches(cursor, None, limit=PARSE_BATCH_SIZE)
+
+
+# Matches whose parse already failed (missing or truncated demo), and the
+# parse_stats future of every demo queued on the process pool.
+QueuedParses = Tuple[List[Future], Dict[Future, Dict[str, Any]]]
+
+
+def submit_parses(
+    matches: Sequence[Dict[str, Any]], parse_pool: ProcessPoolExecutor
+) -> QueuedParses:
+    """Queue every usable demo of a batch on the process pool.
+
+    Missing or truncated demos fail straight away without reaching the pool.
+    """
+    rejected = []
+    parses = {}
+    for match in matches:
+        match_id_value = int(match["id"])
+        reason = demo_file_problem(match.get("file_path"))
+        if reason:
+            failed: Future = Future()
+            failed.set_result((match_id_value, None, reason))
+            rejected.append(failed)
+            continue
+        try:
+            parsed = parse_pool.submit(
+                parse_stats,
+                match["file_path"],
+                str(match["user_id"]),
+                match_id_value,
+                match.get("username"),
+            )
+        except BrokenProcessPool as exc:
+            # A worker died mid-batch; report this match like the others
+            # that were in flight so finish_batch can release it.
+            parsed = Future()
+            parsed.set_exception(exc)
+        parses[parsed] = match
+    return rejected, parses
+
+
+def dispatch_parsed(
+    queued: QueuedParses, pool: ThreadedConnectionPool, executor: ThreadPoolExecutor
+) -> List[Any]:
+    """Hand each match to a thread (AI tip, then DB writes) as its parse finishes.
+
+    Blocks until every demo of the batch is parsed and returns the per-match
+    futures for ``finish_batch``.
+    """
+    rejected, parses = queued
+    futures = list(rejected)
+    for parsed in as_completed(parses):
+        futures.append(executor.submit(parse_match_logic, parses[parsed], pool, parsed))
+    return futures
+
+
+def parse_batch(
+    matches: Sequence[Dict[str, Any]],
+    pool: ThreadedConnectionPool,
+    parse_pool: ProcessPoolExecutor,
+    executor: ThreadPoolExecutor,
+) -> List[Any]:
+    """Run a batch as a two-stage pipeline and return the per-match futures.
+
+    A slow or throttled AI call never leaves the parse processes idle: every
+    demo is queued up front, and each match moves on as soon as it's parsed.
+    """
+    return dispatch_parsed(submit_parses(matches, parse_pool), pool, executor)
+
+
 def parse_match_logic(
-    match: Dict[str, Any], pool: QueuePool
-) -> Tuple[int, bool, Optional[str]]:
+    match: Dict[str, Any],
+    pool: ThreadedConnectionPool,
+    parsed: Future,
+) -> Tuple[int, Optional[TipRow], Optional[str]]:
+    """Store the stats of one parsed match.
+
+    ``parsed`` is the match's ``parse_stats`` future. Returns ``(match_id, tip_row, reason)``:
+    ``tip_row`` is set on success and is written later by
+    ``mark_parsed_batch``; ``reason`` is set on failure. Match status updates
+    are left to the caller so a whole batch costs one round-trip (see
+    ``finish_batch``).
+    """
     match_id_value = int(match["id"])
-    steam_id = str(match["user_id"])
-    username = match.get("username")
     language = match.get("language")
     coach_style = match.get("coach_style")
-    file_path = match.get("file_path")
     if os.getenv("DEBUG_DEMO") == "1":
         print(
             f"DEBUG: user settings language={language}, coach_style={coach_style}"
         )
 
-    conn = pool.connect()
     try:
-        db_conn = conn.driver_connection
-        with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            if not file_path or not os.path.exists(file_path):
-                mark_error(cursor, match_id_value, "missing demo file")
-                db_conn.commit()
-                return match_id_value, False, "missing demo file"
+        stats = parsed.result()
+        match_meta = stats.get("match_meta", {})
+        players_stats = stats.get("players_stats", [])
+        rounds_history = stats.get("rounds", [])
+
+        # The tip comes first so no pooled connection is held while the AI
+        # call waits on quota, and a failed tip leaves no stats behind.
+        tip = get_ai_coaching_tip(stats, language, coach_style, match_id=match_id_value)
+        if not tip:
+            raise RuntimeError("Coach tip was empty")
+
+        # ``with db_conn`` commits on success and rolls back on any exception
+        # (pool connections are never in autocommit mode). The row lock keeps
+        # a match another process already finished from being overwritten.
+        with checkout(pool) as db_conn, db_conn, db_conn.cursor(
+            cursor_factory=RealDictCursor
+        ) as cursor:
+            if not lock_unparsed_match(cursor, match_id_value):
+                return match_id_value, None, "ALREADY_PARSED::"
+            match_row_id = insert_match_row(cursor, match_meta, match_id_value)
+            insert_player_stats(cursor, match_row_id, players_stats)
+            insert_rounds(cursor, match_row_id, rounds_history)
+
+        # Generate stats card image (non-blocking — failure won't stop the tip)
+        tip_image_url = None
+        if generate_stats_image is not None:
+            try:
+                tip_image_url = generate_stats_image(stats, match_id=match_id_value)
+            except Exception as img_exc:
+                log(f"Stats card generation failed for match {match_id_value}: {img_exc}")
+
+        # Generate Arabic tip as image for better readability in Steam chat
+        tip_text_image_url = None
+        language_lower = (language or "").strip().lower()
+        if language_lower in {"ar", "arabic", "العربية"} and generate_arabic_tip_image is not None:
+            try:
+                map_name = stats.get("map_name")
+                result = stats.get("winner")
+                tip_text_image_url = generate_arabic_tip_image(
+                    tip,
+                    match_id=match_id_value,
+                    map_name=map_name,
+                    result=result,
+                )
+            except Exception as ar_img_exc:
+                log(f"Arabic tip image generation failed for match {match_id_value}: {ar_img_exc}")
+
+        return match_id_value, (match_id_value, tip, tip_image_url, tip_text_image_url), None
+    except BrokenProcessPool as exc:
+        return match_id_value, None, f"WORKER_CRASHED::{exc}"
+    except Exception as exc:
+        if is_quota_error(exc):
+            return match_id_value, None, f"QUOTA_EXCEEDED::{exc}"
+        return match_id_value, None, str(exc)
 
+
+class ParseWorkerCrashed(BrokenProcessPool):
+    """A parse worker died; ``match_ids`` were in flight with it and got no result."""
+
+    def __init__(self, match_ids: List[int]) -> None:
+        super().__init__(f"parse worker died with {len(match_ids)} match(es) in flight")
+        self.match_ids = match_ids
+
+
+def finish_batch(pool: ThreadedConnectionPool, futures: List[Any]) -> Optional[int]:
+    """Collect parse results and write every status update in one transaction.
+
+    Returns the quota back-off in seconds if any match hit the AI quota, else
+    None. If a parse worker died, raises ``ParseWorkerCrashed`` once the
+    statuses are written: a match that was alone in the pool when it broke is
+    the one that crashed it and is marked failed; when several were in flight
+    their claims are released and their ids are attached to the exception.
+    """
+    tip_rows: List[TipRow] = []
+    failures: List[Tuple[int, str]] = []
+    quota_ids: List[int] = []
+    crashed_ids: List[int] = []
+    skipped_ids: List[int] = []
+    retry_after = None
+    for future in as_completed(futures):
+        match_id_value, tip_row, reason = future.result()
+        if tip_row is not None:
+            tip_rows.append(tip_row)
+        elif reason and str(reason).startswith("QUOTA_EXCEEDED::"):
+            # Release the claim so the match is retried after the back-off.
+            log(f"Match {match_id_value} failed: {reason}")
+            quota_ids.append(match_id_value)
+            retry_after = parse_retry_after_seconds(Exception(str(reason)))
+        elif reason and str(reason).startswith("WORKER_CRASHED::"):
+            crashed_ids.append(match_id_value)
+        elif reason and str(reason).startswith("ALREADY_PARSED::"):
+            skipped_ids.append(match_id_value)
+        else:
+            failures.append((match_id_value, reason or "unknown error"))
+
+    crashed = bool(crashed_ids)
+    if len(crashed_ids) == 1:
+        failures.append((crashed_ids.pop(), "demo crashed the parse worker"))
+
+    with checkout(pool) as db_conn, db_conn, db_conn.cursor(
+        cursor_factory=RealDictCursor
+    ) as cursor:
+        written = mark_parsed_batch(cursor, tip_rows)
+        mark_error_batch(cursor, failures)
+        release_claims(cursor, quota_ids + crashed_ids + skipped_ids)
+
+    for match_id_value, *_ in tip_rows:
+        if match_id_value in written:
+            log(f"Saved coach tip for match {match_id_value}.")
+        else:
+            log(
+                f"Match {match_id_value} got a coach tip from another process "
+                "meanwhile — kept that tip."
+            )
+    for match_id_value in skipped_ids:
+        log(f"Match {match_id_value} already parsed by another process — skipping.")
+    for match_id_value, reason in failures:
+        log(f"Match {match_id_value} failed: {reason}")
+
+    if crashed:
+        raise ParseWorkerCrashed(crashed_ids)
+    if quota_ids:
+        return retry_after or QUOTA_BACKOFF_SECONDS
+    return None
+
+
+def isolate_crashed(
+    pool: ThreadedConnectionPool, parse_pool: ProcessPoolExecutor, match_ids: List[int]
+) -> ProcessPoolExecutor:
+    """Re-parse matches that died with a parse worker, one at a time.
+
+    Alone in the pool, the demo that kills the worker is caught by
+    ``finish_batch`` and marked failed; the others parse normally. Returns the
+    process pool to keep using, rebuilt if it broke again.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for match_id in match_ids:
+            with checkout(pool) as db_conn, db_conn, db_conn.cursor(
+                cursor_factory=RealDictCursor
+            ) as cursor:
+                matches = fetch_matches(cursor, match_id, limit=1)
+            if not matches:
+                continue
             try:
-                stats = parse_stats(file_path, steam_id, match_id_value, username)
-                match_meta = stats.get("match_meta", {})
-                players_stats = stats.get("players_stats", [])
-                rounds_history = stats.get("rounds", [])
-                match_row_id = insert_match_row(cursor, match_meta, match_id_value)
-                insert_player_stats(cursor, match_row_id, players_stats)
-                insert_rounds(cursor, match_row_id, rounds_history)
-
-                tip = get_ai_coaching_tip(stats, language, coach_style, match_id=match_id_value)
-                if not tip:
-                    raise RuntimeError("Coach tip was empty")
-
-                # Generate stats card image (non-blocking — failure won't stop the tip)
-                tip_image_url = None
-                if generate_stats_image is not None:
-                    try:
-                        tip_image_url = generate_stats_image(stats, match_id=match_id_value)
-                    except Exception as img_exc:
-                        log(f"Stats card generation failed for match {match_id_value}: {img_exc}")
-
-                # Generate Arabic tip as image for better readability in Steam chat
-                tip_text_image_url = None
-                language_lower = (language or "").strip().lower()
-                if language_lower in {"ar", "arabic", "العربية"} and generate_arabic_tip_image is not None:
-                    try:
-                        map_name = stats.get("map_name")
-                        result = stats.get("winner")
-                        tip_text_image_url = generate_arabic_tip_image(
-                            tip,
-                            match_id=match_id_value,
-                            map_name=map_name,
-                            result=result,
-                        )
-                    except Exception as ar_img_exc:
-                        log(f"Arabic tip image generation failed for match {match_id_value}: {ar_img_exc}")
-
-                written = mark_parsed(cursor, match_id_value, tip, tip_image_url=tip_image_url, tip_text_image_url=tip_text_image_url)
-                db_conn.commit()
-                if not written:
-                    log(f"Match {match_id_value} already parsed by another process — skipping.")
-                    return match_id_value, True, None
-                return match_id_value, True, None
-            except Exception as exc:
-                if is_quota_error(exc):
-                    db_conn.rollback()
-                    return match_id_value, False, f"QUOTA_EXCEEDED::{exc}"
-                db_conn.rollback()
-                mark_error(cursor, match_id_value, str(exc))
-                db_conn.commit()
-                return match_id_value, False, str(exc)
-    finally:
-        conn.close()
+                finish_batch(pool, parse_batch(matches, pool, parse_pool, executor))
+            except BrokenProcessPool:
+                parse_pool.shutdown(wait=False, cancel_futures=True)
+                parse_pool = new_parse_pool()
+    return parse_pool
 
 
 def main() -> None:
@@ -2986,34 +3676,26 @@ def main() -> None:
         except ValueError:
             raise RuntimeError("Match id must be an integer")
 
-    pool = QueuePool(
-        lambda: psycopg2.connect(db_url),
-        pool_size=PARSE_DB_POOL,
-        max_overflow=PARSE_DB_OVERFLOW,
+    pool = ThreadedConnectionPool(
+        PARSE_DB_POOL, PARSE_DB_POOL + PARSE_DB_OVERFLOW, db_url
     )
-    set_rate_limiter(RateLimiter(max_calls=PARSE_RATE_LIMIT, period_seconds=60))
+    parse_pool = new_parse_pool()
+    set_rate_limiter(TokenBucket(PARSE_RATE_LIMIT, 60) if PARSE_RATE_LIMIT > 0 else None)
+    set_ai_limiter(AimdLimiter(PARSE_AI_MIN_CONCURRENCY, PARSE_AI_MAX_CONCURRENCY))
 
     # Single match mode (triggered by replay_downloader)
     if match_id is not None:
         log(f"Parsing single match {match_id}...")
-        conn = pool.connect()
-        try:
-            db_conn = conn.driver_connection
-            with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                matches = fetch_matches(cursor, match_id, limit=1)
-        finally:
-            conn.close()
+        with checkout(pool) as db_conn, db_conn, db_conn.cursor(
+            cursor_factory=RealDictCursor
+        ) as cursor:
+            matches = fetch_matches(cursor, match_id, limit=1)
         if not matches:
             log("No matches to parse.")
             return
-        with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
-            futures = [executor.submit(parse_match_logic, match, pool) for match in matches]
-            for future in as_completed(futures):
-                match_id_value, success, reason = future.result()
-                if success:
-                    log(f"Saved coach tip for match {match_id_value}.")
-                else:
-                    log(f"Match {match_id_value} failed: {reason}")
+        with parse_pool, ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+            finish_batch(pool, parse_batch(matches, pool, parse_pool, executor))
+        pool.closeall()
         return
 
     # Daemon mode — run forever
@@ -3021,53 +3703,72 @@ def main() -> None:
     log("Demo Parser daemon started")
     log(f"  Model          : {MODEL_NAME}")
     log(f"  Workers        : {PARSE_WORKERS}")
+    log(f"  Parse processes: {PARSE_PROCESSES}")
     log(f"  Batch size     : {PARSE_BATCH_SIZE}")
-    log(f"  Rate limit     : {PARSE_RATE_LIMIT} calls/60s")
+    log(f"  Rate limit     : {PARSE_RATE_LIMIT} calls/60s (token bucket, 0 = off)")
+    log(f"  AI concurrency : {PARSE_AI_MIN_CONCURRENCY}-{PARSE_AI_MAX_CONCURRENCY} (AIMD)")
     log(f"  DB pool        : {PARSE_DB_POOL} + {PARSE_DB_OVERFLOW} overflow")
-    log(f"  Poll interval  : {PARSE_POLL_INTERVAL}s")
+    log(f"  Error back-off : {PARSE_POLL_INTERVAL}s")
+    log(f"  Listen channel : {MATCHES_READY_CHANNEL} (idle re-check {PARSE_LISTEN_TIMEOUT}s)")
     log(f"  Cleanup interval: {CLEANUP_INTERVAL}s")
     log(f"  Waiting for downloaded demos...")
     log("=" * 50)
 
+    listener = MatchListener(db_url)
     last_cleanup = 0.0
+    # The next batch: already claimed, its demos already queued for parsing.
+    pending: Optional[Tuple[List[Dict[str, Any]], QueuedParses]] = None
     while True:
         try:
-            conn = pool.connect()
-            try:
-                db_conn = conn.driver_connection
-                with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    matches = fetch_matches(cursor, None, limit=PARSE_BATCH_SIZE)
-            finally:
-                conn.close()
-
-            if not matches:
-                time.sleep(PARSE_POLL_INTERVAL)
-                continue
-
-            log(f"Found {len(matches)} match(es) to parse.")
-
             with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
-                futures = [executor.submit(parse_match_logic, match, pool) for match in matches]
-                quota_hit = False
-                retry_after = None
-                for future in as_completed(futures):
-                    match_id_value, success, reason = future.result()
-                    if success:
-                        log(f"Saved coach tip for match {match_id_value}.")
-                    else:
-                        log(f"Match {match_id_value} failed: {reason}")
-                        if reason and str(reason).startswith("QUOTA_EXCEEDED::"):
-                            quota_hit = True
-                            retry_after = parse_retry_after_seconds(Exception(str(reason)))
-
-                if quota_hit:
-                    sleep_seconds = retry_after or 45
+                if pending is None:
+                    matches = claim_batch(pool)
+                    if not matches:
+                        listener.wait(PARSE_LISTEN_TIMEOUT)
+                        continue
+                    pending = (matches, submit_parses(matches, parse_pool))
+
+                # A batch that fails before it is finished is left to its
+                # claim TTL rather than retried in a loop.
+                (matches, queued), pending = pending, None
+                log(f"Found {len(matches)} match(es) to parse.")
+                futures = dispatch_parsed(queued, pool, executor)
+
+                # Every demo of this batch is parsed; claim the next one and
+                # queue its demos now so they parse while the AI and DB
+                # stages finish this one.
+                try:
+                    upcoming = claim_batch(pool)
+                except psycopg2.Error as exc:
+                    log(f"Could not claim the next batch early ({exc}).")
+                    upcoming = []
+                if upcoming:
+                    pending = (upcoming, submit_parses(upcoming, parse_pool))
+
+                sleep_seconds = finish_batch(pool, futures)
+                if sleep_seconds:
                     log(f"Quota exceeded. Sleeping {sleep_seconds}s...")
                     time.sleep(sleep_seconds)
                     continue
 
+        except BrokenProcessPool as exc:
+            log(f"Parse worker process died ({exc}); restarting process pool.")
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+            parse_pool = new_parse_pool()
+            suspects = getattr(exc, "match_ids", [])
+            if suspects:
+                log(f"Re-parsing {len(suspects)} match(es) one at a time to find the bad demo.")
+                try:
+                    parse_pool = isolate_crashed(pool, parse_pool, suspects)
+                except Exception as isolate_exc:
+                    log(f"Parse cycle error: {isolate_exc}")
+            if pending is not None:
+                # Its demos were queued on the pool that died; queue them
+                # again only now, so each suspect above ran alone.
+                pending = (pending[0], submit_parses(pending[0], parse_pool))
         except Exception as exc:
             log(f"Parse cycle error: {exc}")
+            time.sleep(PARSE_POLL_INTERVAL)
 
         # Periodically clean up demo files that are fully processed
         now = time.time()
@@ -3080,8 +3781,6 @@ def main() -> None:
                 log(f"Cleanup error: {exc}")
             last_cleanup = now
 
-        time.sleep(PARSE_POLL_INTERVAL)
-
 
 if __name__ == "__main__":
     main()
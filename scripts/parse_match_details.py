@@ -1,6 +1,6 @@
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 import psycopg2
@@ -10,7 +10,15 @@ SCRIPTS_DIR = os.path.dirname(__file__)
 if SCRIPTS_DIR not in sys.path:
     sys.path.insert(0, SCRIPTS_DIR)
 
-from parse_match import get_db_url, insert_match_row, insert_player_stats, parse_stats
+from parse_match import (
+    PARSE_CLAIM_TTL,
+    demo_file_problem,
+    get_db_url,
+    insert_match_row,
+    insert_player_stats,
+    parse_stats,
+    release_claims,
+)
 
 load_dotenv(".env.local")
 load_dotenv()
@@ -22,99 +30,86 @@ def fetch_matches(
     limit: int,
     force: bool,
 ) -> List[Dict[str, Any]]:
-    if match_id is not None:
-        cursor.execute(
-            """
-            select
-                mtd.id,
-                mtd.user_id,
-                mtd.file_path,
-                mtd.status,
-                m.id as match_row_id,
-                m.map_name,
-                coalesce(stats.stats_count, 0) as stats_count
-            from public.matches_to_download mtd
-            left join public.matches m
-                on m.match_id::text = mtd.id::text
-            left join (
-                select match_id, count(*) as stats_count
-                from public.player_match_stats
-                group by match_id
-            ) stats
-                on stats.match_id = m.id
-            where mtd.id = %s
-            """,
-            (match_id,),
-        )
-        row = cursor.fetchone()
-        return [row] if row else []
+    """Claim matches whose match row, map name or player stats are missing.
 
+    With ``force`` every candidate is returned, complete or not.
+    """
+    if match_id is not None:
+        candidates = "mtd.id = %s"
+        params: Tuple[Any, ...] = (match_id,)
+    else:
+        candidates = "mtd.status in ('downloaded', 'processed', 'parsed', 'notified')"
+        params = ()
     cursor.execute(
-        """
+        f"""
         select
             mtd.id,
             mtd.user_id,
-            mtd.file_path,
-            mtd.status,
-            m.id as match_row_id,
-            m.map_name,
-            coalesce(stats.stats_count, 0) as stats_count
+            mtd.file_path
         from public.matches_to_download mtd
         left join public.matches m
             on m.match_id::text = mtd.id::text
-        left join (
-            select match_id, count(*) as stats_count
+        left join lateral (
+            select true as has_stats
             from public.player_match_stats
-            group by match_id
-        ) stats
-            on stats.match_id = m.id
-        where mtd.status in ('downloaded', 'processed', 'parsed', 'notified')
+            where match_id = m.id
+            limit 1
+        ) stats on true
+        where {candidates}
           and (
             %s
             or m.id is null
             or m.map_name is null
-            or stats.stats_count is null
-            or stats.stats_count = 0
+            or stats.has_stats is null
           )
+          and (mtd.parse_claimed_at is null
+               or mtd.parse_claimed_at < now() - %s * interval '1 second')
         order by mtd.id asc
         limit %s
+        for update of mtd skip locked
+        """,
+        params + (force, PARSE_CLAIM_TTL, limit),
+    )
+    rows = cursor.fetchall()
+    claim_matches(cursor, rows)
+    return rows
+
+
+def claim_matches(cursor: RealDictCursor, rows: List[Dict[str, Any]]) -> None:
+    """Stamp the locked rows so parse_match.py and other runs skip them."""
+    if not rows:
+        return
+    cursor.execute(
+        """
+        update public.matches_to_download
+        set parse_claimed_at = now()
+        where id = any(%s::bigint[])
         """,
-        (force, limit),
+        ([row["id"] for row in rows],),
     )
-    return cursor.fetchall()
 
 
 def mark_parsed(cursor: RealDictCursor, match_id: int) -> None:
+    """Move a downloaded match to 'parsed' and drop its claim in one statement."""
     cursor.execute(
         """
         update public.matches_to_download
-        set status = 'parsed'
+        set status = case when status = 'downloaded' then 'parsed' else status end,
+            parse_claimed_at = null
         where id = %s
         """,
         (match_id,),
     )
 
 
-def should_parse(match: Dict[str, Any], force: bool) -> bool:
-    if force:
-        return True
-    if match.get("match_row_id") is None:
-        return True
-    if match.get("map_name") is None:
-        return True
-    stats_count = match.get("stats_count")
-    if stats_count is None:
-        return True
-    return int(stats_count) <= 0
-
-
 def parse_match_row(cursor: RealDictCursor, match: Dict[str, Any]) -> None:
     match_id = int(match["id"])
     steam_id = str(match["user_id"])
     file_path = match.get("file_path")
 
-    if not file_path or not os.path.exists(file_path):
-        raise FileNotFoundError(f"Demo file not found: {file_path}")
+    reason = demo_file_problem(file_path)
+    if reason:
+        raise ValueError(f"Cannot parse {file_path}: {reason}")
 
     stats = parse_stats(file_path, steam_id, match_id)
     match_meta = stats.get("match_meta", {})
@@ -122,9 +117,7 @@ def parse_match_row(cursor: RealDictCursor, match: Dict[str, Any]) -> None:
 
     match_row_id = insert_match_row(cursor, match_meta, match_id)
     insert_player_stats(cursor, match_row_id, players_stats)
-
-    if match.get("status") == "downloaded":
-        mark_parsed(cursor, match_id)
+    mark_parsed(cursor, match_id)
 
 
 def main() -> None:
@@ -150,22 +143,29 @@ def main() -> None:
 
     with psycopg2.connect(db_url) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            matches = fetch_matches(cursor, match_id, limit, force)
+            # Commit the claim right away so the row locks are short-lived.
+            with conn:
+                matches = fetch_matches(cursor, match_id, limit, force)
             if not matches:
                 print("No downloaded matches to parse.")
                 return
 
-            for match in matches:
-                try:
-                    if not should_parse(match, force):
-                        print(f"Skipping match {match['id']} (already complete).")
-                        continue
-                    parse_match_row(cursor, match)
-                    conn.commit()
-                    print(f"Parsed match {match['id']}.")
-                except Exception as exc:
-                    conn.rollback()
-                    print(f"Failed to parse match {match['id']}: {exc}")
+            # Parsed matches drop their claim in their own commit; failed ones
+            # are released together once the run is over.
+            unfinished: List[int] = []
+            try:
+                for match in matches:
+                    try:
+                        # One transaction per match: commit on success, rollback on error.
+                        with conn:
+                            parse_match_row(cursor, match)
+                        print(f"Parsed match {match['id']}.")
+                    except Exception as exc:
+                        print(f"Failed to parse match {match['id']}: {exc}")
+                        unfinished.append(match["id"])
+            finally:
+                with conn:
+                    release_claims(cursor, unfinished)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ import sys
 import time
 import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 # Fix Windows console encoding for Unicode player names
 if sys.platform == "win32":
@@ -22,6 +22,10 @@ except ImportError:
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from rate_limit import TokenBucket
 
 API_URL = "https://api.steampowered.com/ICSGOPlayers_730/GetNextMatchSharingCode/v1"
 MAX_MATCHES_PER_USER = int(os.getenv("MAX_MATCHES_PER_USER", "50"))
@@ -56,27 +60,51 @@ def has_column(cursor: RealDictCursor, table: str, column: str) -> bool:
     return cursor.fetchone() is not None
 
 
-def fetch_users(cursor: RealDictCursor, use_auth_code_valid: bool) -> Iterable[Dict[str, Any]]:
+# The schema rarely changes, so the auth_code_valid probe is only re-run
+# every few hours instead of on every poll cycle.
+AUTH_COLUMN_RECHECK_SECONDS = 6 * 3600
+_auth_code_valid_probe: Optional[Tuple[bool, float]] = None
+
+
+def users_have_auth_code_valid(cursor: RealDictCursor) -> bool:
+    global _auth_code_valid_probe
+    now = time.time()
+    if (
+        _auth_code_valid_probe is None
+        or now - _auth_code_valid_probe[1] >= AUTH_COLUMN_RECHECK_SECONDS
+    ):
+        _auth_code_valid_probe = (has_column(cursor, "users", "auth_code_valid"), now)
+    return _auth_code_valid_probe[0]
+
+
+USERS_ITERSIZE = int(os.getenv("USERS_ITERSIZE", "1000"))
+
+
+def fetch_users(conn, use_auth_code_valid: bool) -> Iterator[Dict[str, Any]]:
+    """Stream pollable users through a server-side cursor.
+
+    Rows arrive in batches of USERS_ITERSIZE, so the caller must finish
+    iterating before the surrounding transaction ends.
+    """
     if use_auth_code_valid:
-        cursor.execute(
-            """
+        query = """
             select steam_id, auth_code, last_known_match_code
             from public.users
             where auth_code is not null
               and auth_code <> ''
               and (auth_code_valid is null or auth_code_valid = true)
-            """
-        )
+        """
     else:
-        cursor.execute(
-            """
+        query = """
             select steam_id, auth_code, last_known_match_code
             from public.users
             where auth_code is not null
               and auth_code <> ''
-            """
-        )
-    return cursor.fetchall()
+        """
+    with conn.cursor(name="users_iter", cursor_factory=RealDictCursor) as cursor:
+        cursor.itersize = USERS_ITERSIZE
+        cursor.execute(query)
+        yield from cursor
 
 
 def flag_auth_invalid(
@@ -102,26 +130,23 @@ def flag_auth_invalid(
         )
 
 
-def insert_match(
-    cursor: RealDictCursor, share_code: str, steam_id: int
+def record_new_matches(
+    cursor: RealDictCursor, share_codes: List[str], known_code: str, steam_id: int
 ) -> None:
+    """Queue ``share_codes`` and advance the user's known code in one statement."""
     cursor.execute(
         """
-        insert into public.matches_to_download (share_code, status, user_id)
-        values (%s, %s, %s)
-        """,
-        (share_code, "pending", steam_id),
-    )
-
-
-def update_last_known(cursor: RealDictCursor, share_code: str, steam_id: int) -> None:
-    cursor.execute(
-        """
+        with queued as (
+            insert into public.matches_to_download (share_code, status, user_id)
+            select share_code, 'pending', %s
+            from unnest(%s::text[]) as share_code
+            on conflict do nothing
+        )
         update public.users
         set last_known_match_code = %s
         where steam_id = %s
         """,
-        (share_code, steam_id),
+        (steam_id, share_codes, known_code, steam_id),
     )
 
 
@@ -157,6 +182,8 @@ def redact_value(value: Optional[str], keep: int = 4) -> str:
 
 
 POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", "5"))
+# Steam API calls per minute across all workers; 0 disables the limit.
+POLL_RATE_LIMIT = int(os.getenv("POLL_RATE_LIMIT", "0"))
 
 
 def log(msg: str) -> None:
@@ -164,13 +191,44 @@ def log(msg: str) -> None:
     print(f"[{ts}] [Poller] {msg}", flush=True)
 
 
+def build_session() -> requests.Session:
+    """Steam API session shared by all poll workers.
+
+    Keeps one keep-alive connection per worker and retries 429/5xx responses
+    with exponential backoff, honouring Retry-After. The final response is
+    returned instead of raised so poll_user still logs it.
+    """
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_maxsize=max(POLL_CONCURRENCY, 10), max_retries=retry),
+    )
+    return session
+
+
+# (steam_id, newest share code seen, share codes to insert, auth rejected)
+PollResult = Tuple[int, Optional[str], List[str], bool]
+
+
 def poll_user(
     api_key: str,
-    db_url: str,
+    session: requests.Session,
     user: Dict[str, Any],
-    use_auth_code_valid: bool,
-) -> int:
-    """Poll a single user for new matches. Returns number of matches found."""
+    limiter: Optional[TokenBucket] = None,
+) -> PollResult:
+    """Poll a single user for new matches.
+
+    Only talks to the Steam API; the caller writes the result to the database
+    so the workers don't each need their own connection.
+    """
     steam_id = int(user["steam_id"])
     auth_code = str(user["auth_code"]).strip()
     known_code = user.get("last_known_match_code")
@@ -182,115 +240,137 @@ def poll_user(
             f"Missing known match code for {steam_id}. "
             "Set last_known_match_code in the users table first."
         )
-        return 0
+        return steam_id, None, [], False
 
     fetched = 0
     latest_only_code: Optional[str] = None
-    session = requests.Session()
+    new_codes: List[str] = []
 
-    with psycopg2.connect(db_url) as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            while fetched < MAX_MATCHES_PER_USER:
-                params = build_params(api_key, steam_id, auth_code, known_code)
-                try:
-                    response = session.get(API_URL, params=params, timeout=15)
-                except requests.RequestException as exc:
-                    log(f"Steam API error for {steam_id}: {exc}")
-                    break
-
-                if response.status_code == 200:
-                    payload = response.json()
-                    share_code = parse_share_code(payload)
-                    if not share_code:
-                        log(f"No share code returned for {steam_id}.")
-                        break
-
-                    if share_code == known_code:
-                        log(f"No new match for {steam_id}.")
-                        break
-
-                    known_code = share_code
-                    update_last_known(cursor, share_code, steam_id)
-                    conn.commit()
-                    fetched += 1
-                    if LATEST_ONLY:
-                        latest_only_code = share_code
-                    else:
-                        insert_match(cursor, share_code, steam_id)
-                        conn.commit()
-                        log(f"New match for {steam_id}: {share_code}")
-                    continue
-
-                if response.status_code == 202:
-                    if fetched == 0:
-                        log(f"No new match for {steam_id}.")
-                    if LATEST_ONLY and latest_only_code:
-                        insert_match(cursor, latest_only_code, steam_id)
-                        conn.commit()
-                        log(
-                            f"Latest match for {steam_id}: {latest_only_code}"
-                        )
-                    break
-
-                if response.status_code in (401, 403):
-                    flag_auth_invalid(cursor, steam_id, use_auth_code_valid)
-                    conn.commit()
-                    log(f"Auth invalid for {steam_id}; flagged.")
-                    break
-
-                safe_params = {
-                    "steamid": str(steam_id),
-                    "steamidkey": redact_value(auth_code),
-                    "knowncode": redact_value(known_code),
-                }
-                body_preview = response.text[:500]
-                if response.status_code == 412:
-                    log(f"Precondition failed for {steam_id} (412).")
-                    log(f"Params: {safe_params}")
-                    log(f"Headers: {dict(response.headers)}")
-                    log(f"Body: {body_preview}")
-                    break
+    while fetched < MAX_MATCHES_PER_USER:
+        params = build_params(api_key, steam_id, auth_code, known_code)
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.get(API_URL, params=params, timeout=15)
+        except requests.RequestException as exc:
+            log(f"Steam API error for {steam_id}: {exc}")
+            break
+
+        if response.status_code == 200:
+            payload = response.json()
+            share_code = parse_share_code(payload)
+            if not share_code:
+                log(f"No share code returned for {steam_id}.")
+                break
+
+            if share_code == known_code:
+                log(f"No new match for {steam_id}.")
+                break
 
+            known_code = share_code
+            fetched += 1
+            if LATEST_ONLY:
+                latest_only_code = share_code
+            else:
+                new_codes.append(share_code)
+                log(f"New match for {steam_id}: {share_code}")
+            continue
+
+        if response.status_code == 202:
+            if fetched == 0:
+                log(f"No new match for {steam_id}.")
+            if LATEST_ONLY and latest_only_code:
+                new_codes.append(latest_only_code)
                 log(
-                    "Unexpected status for"
-                    f" {steam_id}: {response.status_code}"
+                    f"Latest match for {steam_id}: {latest_only_code}"
                 )
-                log(f"Params: {safe_params}")
-                log(f"Body: {body_preview}")
-                break
+            break
+
+        if response.status_code in (401, 403):
+            log(f"Auth invalid for {steam_id}; flagging.")
+            return steam_id, known_code if fetched else None, new_codes, True
+
+        safe_params = {
+            "steamid": str(steam_id),
+            "steamidkey": redact_value(auth_code),
+            "knowncode": redact_value(known_code),
+        }
+        body_preview = response.text[:500]
+        if response.status_code == 412:
+            log(f"Precondition failed for {steam_id} (412).")
+            log(f"Params: {safe_params}")
+            log(f"Headers: {dict(response.headers)}")
+            log(f"Body: {body_preview}")
+            break
 
-    return fetched
+        log(
+            "Unexpected status for"
+            f" {steam_id}: {response.status_code}"
+        )
+        log(f"Params: {safe_params}")
+        log(f"Body: {body_preview}")
+        break
 
+    # Progress is saved even if the loop was cut short.
+    return steam_id, known_code if fetched else None, new_codes, False
 
-def poll_once(api_key: str, db_url: str) -> None:
-    """Run a single poll cycle for all users concurrently."""
-    with psycopg2.connect(db_url) as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            use_auth_code_valid = has_column(cursor, "users", "auth_code_valid")
-            users = fetch_users(cursor, use_auth_code_valid)
 
-    if not users:
-        log("No users with auth_code to poll.")
-        return
+def save_poll_result(
+    cursor: RealDictCursor, result: PollResult, use_auth_code_valid: bool
+) -> None:
+    """Write one user's poll progress (run inside a single transaction)."""
+    steam_id, known_code, new_codes, auth_invalid = result
+    if auth_invalid:
+        flag_auth_invalid(cursor, steam_id, use_auth_code_valid)
+    if known_code:
+        record_new_matches(cursor, new_codes, known_code, steam_id)
+
 
-    user_count = len(users)
-    workers = min(POLL_CONCURRENCY, user_count)
-    log(f"Polling {user_count} user(s) with {workers} worker(s)...")
+def poll_once(
+    api_key: str,
+    db_url: str,
+    session: requests.Session,
+    limiter: Optional[TokenBucket] = None,
+) -> None:
+    """Run a single poll cycle for all users concurrently.
 
+    Workers only make Steam API calls; results are written here, on one
+    connection, as each user finishes.
+    """
+    conn = psycopg2.connect(db_url)
     total_matches = 0
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {
-            executor.submit(poll_user, api_key, db_url, user, use_auth_code_valid): user
-            for user in users
-        }
-        for future in as_completed(futures):
-            user = futures[future]
-            try:
-                found = future.result()
-                total_matches += found
-            except Exception as exc:
+    try:
+        with ThreadPoolExecutor(max_workers=POLL_CONCURRENCY) as executor:
+            # Submit users as they stream in so polling starts before the
+            # whole table has been read; the cursor closes with this transaction.
+            with conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    use_auth_code_valid = users_have_auth_code_valid(cursor)
+                futures = {
+                    executor.submit(poll_user, api_key, session, user, limiter): user
+                    for user in fetch_users(conn, use_auth_code_valid)
+                }
+
+            if not futures:
+                log("No users with auth_code to poll.")
+                return
+
+            user_count = len(futures)
+            workers = min(POLL_CONCURRENCY, user_count)
+            log(f"Polling {user_count} user(s) with {workers} worker(s)...")
+
+            for future in as_completed(futures):
+                user = futures[future]
                 steam_id = user.get("steam_id", "?")
-                log(f"Error polling user {steam_id}: {exc}")
+                try:
+                    result = future.result()
+                    with conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                        save_poll_result(cursor, result, use_auth_code_valid)
+                    total_matches += len(result[2])
+                except Exception as exc:
+                    log(f"Error polling user {steam_id}: {exc}")
+    finally:
+        conn.close()
 
     log(f"Cycle complete. {user_count} user(s) checked, {total_matches} new match(es).")
 
@@ -311,13 +391,20 @@ def main() -> None:
     log("Match Poller daemon started")
     log(f"  Poll interval : {interval}s")
     log(f"  Concurrency   : {POLL_CONCURRENCY} workers")
+    log(f"  Rate limit    : {POLL_RATE_LIMIT or 'off'} calls/60s")
     log(f"  Latest only   : {LATEST_ONLY}")
     log(f"  Max per user  : {MAX_MATCHES_PER_USER}")
     log("=" * 50)
 
+    session = build_session()
+    limiter = (
+        TokenBucket(POLL_RATE_LIMIT, 60)
+        if POLL_RATE_LIMIT > 0
+        else None
+    )
     while True:
         try:
-            poll_once(api_key, db_url)
+            poll_once(api_key, db_url, session, limiter)
         except Exception as exc:
             log(f"Poll cycle error: {exc}")
         log(f"Sleeping {interval}s...")
@@ -0,0 +1,35 @@
+"""Rate limiting shared by the pipeline scripts."""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket shared by all worker threads of a script.
+
+    Tokens refill continuously at ``rate`` per ``period_seconds`` up to
+    ``burst``, so once a burst is spent calls go out at an even pace instead
+    of all at once when a window rolls over.
+    """
+
+    def __init__(self, rate: int, period_seconds: int, burst: Optional[int] = None) -> None:
+        self.fill_rate = rate / period_seconds
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.fill_rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                sleep_for = (1 - self.tokens) / self.fill_rate
+            time.sleep(sleep_for)
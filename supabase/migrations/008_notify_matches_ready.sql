@@ -0,0 +1,17 @@
+-- Wake the parser daemon (LISTEN matches_ready) as soon as a demo is ready to parse
+create or replace function public.notify_match_ready()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.status in ('downloaded', 'processed') and new.coach_tip is null then
+    perform pg_notify('matches_ready', new.id::text);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists matches_to_download_notify_ready on public.matches_to_download;
+create trigger matches_to_download_notify_ready
+after insert or update of status on public.matches_to_download
+for each row execute function public.notify_match_ready();
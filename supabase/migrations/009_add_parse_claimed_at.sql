@@ -0,0 +1,4 @@
+-- Track when a parser claimed a downloaded demo so concurrent parsers skip it
+-- and claims left behind by a crashed parser expire
+ALTER TABLE public.matches_to_download
+ADD COLUMN IF NOT EXISTS parse_claimed_at timestamptz;
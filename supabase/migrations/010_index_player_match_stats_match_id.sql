@@ -0,0 +1,2 @@
+-- Stats lookups and the per-match delete in insert_player_stats filter on match_id
+create index if not exists player_match_stats_match_id_idx on public.player_match_stats (match_id);
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+# parse_match pulls these in at import time.
+for _module in ("dotenv", "groq", "awpy", "psycopg2"):
+    pytest.importorskip(_module)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts"))
+
+import parse_match  # noqa: E402
+
+
+class CopyCursor:
+    """Records the COPY payload instead of talking to Postgres."""
+
+    def __init__(self):
+        self.payload = None
+
+    def execute(self, query, params=None):
+        pass
+
+    def copy_expert(self, sql, buffer):
+        self.payload = buffer.read()
+
+
+def test_insert_player_stats_keeps_exact_steam_id():
+    cursor = CopyCursor()
+    parse_match.insert_player_stats(
+        cursor,
+        1,
+        [
+            {"steam_id": 76561198012345678, "player_name": "a", "kills": 3},
+            {"steam_id": None, "player_name": None, "kills": None},
+        ],
+    )
+    rows = [line.split("\t") for line in cursor.payload.splitlines()]
+    assert rows[0][1] == "76561198012345678"
+    assert rows[1][1] == ""
+    assert "e+" not in cursor.payload
+
+
+def test_aimd_limiter_only_grows_on_success():
+    limiter = parse_match.AimdLimiter(1, 4)
+    limiter.limit = 2.0
+
+    limiter.acquire()
+    limiter.release(False, success=False)
+    assert limiter.limit == 2.0
+    assert limiter.in_flight == 0
+
+    limiter.acquire()
+    limiter.release(False)
+    assert limiter.limit == 3.0
+
+
+def _baseline_buy_counts(purchases, round_key, team_size):
+    buy_counts = {"CT": {}, "T": {}}
+    for (_, team_value), group in purchases.groupby([round_key, "team_norm"]):
+        if team_value not in {"CT", "T"}:
+            continue
+        primary_count = int((group["item_cat"] == "primary").sum())
+        if primary_count >= team_size:
+            buy_type = "full"
+        elif primary_count == 0:
+            buy_type = "eco"
+        else:
+            buy_type = "force"
+        buy_counts[team_value][buy_type] = buy_counts[team_value].get(buy_type, 0) + 1
+    return buy_counts
+
+
+def test_count_buy_types_matches_round_by_round_loop():
+    pd = pytest.importorskip("pandas")
+    # Rows out of round order: round 1 is an eco for CT, so "eco" must come
+    # first even though the force buy's rows appear earlier in the frame.
+    rows = [
+        (3, "CT", "primary"), (3, "CT", "pistol"),
+        (2, "T", "primary"), (2, "T", "primary"),
+        (1, "CT", "pistol"), (1, "T", "grenade"),
+        (2, "CT", "primary"), (2, "CT", "primary"),
+        (3, "T", "pistol"),
+    ]
+    purchases = pd.DataFrame(rows, columns=["round", "team_norm", "item_cat"])
+
+    result = parse_match.count_buy_types(purchases, "round", 2)
+    expected = _baseline_buy_counts(purchases, "round", 2)
+
+    assert result == expected
+    for team in ("CT", "T"):
+        assert list(result[team]) == list(expected[team])
+    assert list(result["CT"]) == ["eco", "full", "force"]